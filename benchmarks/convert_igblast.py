@@ -0,0 +1,77 @@
+'''
+Benchmarks collapsing IgBLAST reads into clones with built-in groupby
+reductions against the previous ``lambda``-based aggregation.
+
+    python benchmarks/convert_igblast.py --reads 10000000
+
+'''
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+import hicutils as hu
+from hicutils.core import io
+
+
+def make_reads(reads, replicates=10, clones=200000, seed=0):
+    rng = np.random.default_rng(seed)
+    clone = rng.integers(0, clones, reads)
+    lengths = 30 + 3 * (clone % 20)
+    return pd.DataFrame(
+        {
+            'replicate_name': rng.integers(0, replicates, reads).astype(str),
+            'v_call': (clone % 50).astype(str),
+            'j_call': (clone % 6).astype(str),
+            'junction_aa': clone.astype(str),
+            'productive': np.where(clone % 7, 'T', 'F'),
+            'junction_length': lengths,
+            'junction': np.where(
+                rng.random(reads) < 0.01,
+                None,
+                rng.integers(0, 4, reads).astype(str),
+            ),
+            'v_identity': rng.uniform(0.8, 1, reads),
+            **{k: 'x' for k in io.DEFAULT_METADATA_REGEX.groupindex.keys()},
+        }
+    )
+
+
+def collapse_with_lambdas(df):
+    df['copies'] = 1
+    return (
+        df.groupby(io.IGBLAST_CLONE_COLS)
+        .agg(
+            {
+                'junction': lambda s: s.iloc[0],
+                'v_identity': np.mean,
+                'copies': np.sum,
+            }
+        )
+        .reset_index()
+    )
+
+
+def _time(func, df):
+    start = time.perf_counter()
+    result = func(df.copy())
+    return time.perf_counter() - start, result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser('Benchmark IgBLAST read collapsing')
+    parser.add_argument('--reads', type=int, default=10000000)
+    parser.add_argument('--clones', type=int, default=200000)
+    args = parser.parse_args()
+
+    hu.logger.info(f'Generating {args.reads} reads')
+    df = make_reads(args.reads, clones=args.clones)
+
+    new_time, new = _time(io._collapse_reads, df)
+    hu.logger.info(f'Built-in reductions: {new_time:.2f}s')
+    old_time, old = _time(collapse_with_lambdas, df)
+    hu.logger.info(f'Lambda reductions: {old_time:.2f}s')
+
+    pd.testing.assert_frame_equal(old, new)
+    hu.logger.info(f'Identical output, {old_time / new_time:.1f}x speedup')
@@ -0,0 +1,232 @@
+'''
+Times and memory-profiles reading, pooling, filtering, metadata and plot data
+preparation on synthetic repertoires (see ``synthetic.py``) at several
+scales, writing the results as JSON.  Passing a previous result file with
+``--baseline`` reports the change of every benchmark and warns about
+regressions.
+
+    python benchmarks/suite.py --scales small medium --output results.json
+    python benchmarks/suite.py --baseline results.json --output new.json
+
+Plots are drawn with the non-interactive Agg backend and figures are never
+rendered, so plot timings are dominated by data preparation.  Peak memory is
+measured with ``tracemalloc`` in a separate run, so it only includes
+allocations in this process.
+
+'''
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+
+import matplotlib
+
+matplotlib.use('Agg')
+
+import matplotlib.pyplot as plt  # noqa: E402
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+import hicutils as hu  # noqa: E402
+from hicutils.core import filters, io, metadata, pooling  # noqa: E402
+import hicutils.plots as plots  # noqa: E402
+
+from synthetic import Repertoire  # noqa: E402
+
+
+SCALES = {
+    'small': dict(replicates=8, clones=2000),
+    'medium': dict(replicates=32, clones=10000),
+    'large': dict(replicates=64, clones=25000),
+}
+POOL = 'subject'
+
+READERS = {
+    'read_directory': lambda path: io.read_directory(path),
+    'read_directory_narrow': lambda path: io.read_directory(
+        path, narrow_dtypes=True
+    ),
+    'convert_igblast': lambda path: io.convert_igblast(
+        os.path.join(path, 'igblast')
+    ),
+}
+
+BENCHMARKS = {
+    'pool_by': lambda df: pooling.pool_by(df, ['subject', 'disease']),
+    'filter_by_overall_copies': lambda df: filters.filter_by_overall_copies(
+        df, 5
+    ),
+    'filter_functional': lambda df: filters.filter_functional(df),
+    'filter_by_gene_frequency': lambda df: filters.filter_by_gene_frequency(
+        df, 0.01
+    ),
+    'filter_number_of_pools': lambda df: filters.filter_number_of_pools(
+        df, POOL, 2
+    ),
+    'filter_by_presence': lambda df: filters.filter_by_presence(
+        df, POOL, df[POOL].iloc[0]
+    ),
+    'remove_potential_contaminates': (
+        lambda df: filters.remove_potential_contaminates(
+            df, POOL, [df[POOL].iloc[0]], 'cdr3_aa'
+        )
+    ),
+    'make_metadata_table': lambda df: metadata.make_metadata_table(df, POOL),
+    'plot_clone_counts': lambda df: plots.plot_clone_counts(df, POOL),
+    'plot_clone_sizes': lambda df: plots.plot_clone_sizes(df, cutoff=20),
+    'plot_top_clones': lambda df: plots.plot_top_clones(df, 20),
+    'plot_ranges': lambda df: plots.plot_ranges(df, POOL),
+    'plot_d_index': lambda df: plots.plot_d_index(df, POOL),
+    'plot_gene_heatmap': lambda df: plots.plot_gene_heatmap(
+        df, POOL, 'v_gene'
+    ),
+    'plot_gene_frequency': lambda df: plots.plot_gene_frequency(
+        df, POOL, 'v_gene'
+    ),
+    'plot_cdr3_aa_usage': lambda df: plots.plot_cdr3_aa_usage(df, POOL),
+    'plot_cdr3_logo': lambda df: plots.plot_cdr3_logo(df, 'cdr3_aa', 12),
+    'plot_cdr3_spectratype': lambda df: plots.plot_cdr3_spectratype(df),
+    'plot_cdr3_distribution': lambda df: plots.plot_cdr3_distribution(
+        df, POOL
+    ),
+    'plot_strings': lambda df: plots.plot_strings(
+        df, POOL, overlapping_features=('cdr3_aa', 'v_gene'), limit=100
+    ),
+    'plot_upset': lambda df: plots.plot_upset(
+        df, 'METADATA_disease', clone_features='cdr3_aa'
+    ),
+    'plot_similarity_heatmap': lambda df: plots.plot_similarity_heatmap(
+        df, POOL, 'jaccard', clone_features='cdr3_aa'
+    ),
+    'plot_shm_distribution': lambda df: plots.plot_shm_distribution(
+        df, POOL, 'copies'
+    ),
+    'plot_shm_aggregate': lambda df: plots.plot_shm_aggregate(df, POOL),
+    'plot_shm_range': lambda df: plots.plot_shm_range(df, POOL),
+    'plot_mutated_fraction': lambda df: plots.plot_mutated_fraction(df, POOL),
+}
+
+
+def _measure(func, repeat, memory=True):
+    '''
+    Returns the fastest of ``repeat`` runs of ``func`` in seconds and, if
+    ``memory`` is ``True``, the peak memory of one more traced run in MB.
+
+    '''
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+        plt.close('all')
+
+    result = {'seconds': min(times)}
+    if memory:
+        tracemalloc.start()
+        func()
+        result['peak_mb'] = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+        plt.close('all')
+    return result
+
+
+def run_scale(scale, names, repeat, memory, seed):
+    params = SCALES[scale]
+    hu.logger.info(f'Generating {scale} repertoire: {params}')
+    repertoire = Repertoire(**params, seed=seed)
+    results = {}
+    with tempfile.TemporaryDirectory() as path:
+        repertoire.write_pooled(path)
+        repertoire.write_igblast(os.path.join(path, 'igblast'))
+        for name, func in READERS.items():
+            if name in names:
+                results[name] = _measure(lambda: func(path), repeat, memory)
+                hu.logger.info(f'{scale} {name}: {results[name]}')
+        df = io.read_directory(path)
+
+    for name, func in BENCHMARKS.items():
+        if name in names:
+            results[name] = _measure(lambda: func(df), repeat, memory)
+            hu.logger.info(f'{scale} {name}: {results[name]}')
+    return {**params, 'rows': len(df), 'results': results}
+
+
+def compare(results, baseline, threshold):
+    '''
+    Logs the change of every benchmark in ``results`` relative to
+    ``baseline`` and returns the number slower by more than ``threshold``.
+
+    '''
+    regressions = 0
+    for scale, scale_results in results['scales'].items():
+        old = baseline['scales'].get(scale, {}).get('results', {})
+        for name, result in scale_results['results'].items():
+            if name not in old:
+                continue
+            ratio = result['seconds'] / old[name]['seconds']
+            message = f'{scale} {name}: {ratio:.2f}x baseline time'
+            if ratio > threshold:
+                regressions += 1
+                hu.logger.warning(message)
+            else:
+                hu.logger.info(message)
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser('Benchmark hicutils')
+    parser.add_argument(
+        '--scales', nargs='+', choices=SCALES.keys(), default=['small']
+    )
+    parser.add_argument(
+        '--only',
+        nargs='+',
+        default=['*'],
+        help='Glob patterns of the benchmarks to run',
+    )
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--no-memory', action='store_true')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline')
+    parser.add_argument(
+        '--threshold',
+        type=float,
+        default=1.2,
+        help='Ratio to the baseline time reported as a regression',
+    )
+    args = parser.parse_args()
+
+    names = {
+        name
+        for name in [*READERS, *BENCHMARKS]
+        if any(fnmatch.fnmatch(name, pattern) for pattern in args.only)
+    }
+    results = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'seed': args.seed,
+        'repeat': args.repeat,
+        'versions': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+        },
+        'scales': {
+            scale: run_scale(
+                scale, names, args.repeat, not args.no_memory, args.seed
+            )
+            for scale in args.scales
+        },
+    }
+    with open(args.output, 'w') as fh:
+        json.dump(results, fh, indent=2)
+    hu.logger.info(f'Wrote results to {args.output}')
+
+    if args.baseline:
+        with open(args.baseline) as fh:
+            regressions = compare(results, json.load(fh), args.threshold)
+        hu.logger.info(f'{regressions} regressions')
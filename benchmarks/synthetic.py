@@ -0,0 +1,305 @@
+'''
+Generates seeded synthetic repertoires for benchmarking, written as pooled
+TSVs with a ``metadata.tsv`` (as read by ``io.read_directory``) and as
+per-replicate IgBLAST TSVs (as read by ``io.convert_igblast``).
+
+    python benchmarks/synthetic.py synthetic/ --replicates 32 --clones 20000
+
+'''
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+import hicutils as hu
+
+
+AMINO_ACIDS = np.frombuffer(b'ACDEFGHIKLMNPQRSTVWY', np.uint8)
+NUCLEOTIDES = np.frombuffer(b'ACGT', np.uint8)
+POOLED_COLUMNS = [
+    'clone_id',
+    'subject',
+    'v_gene',
+    'j_gene',
+    'functional',
+    'insertions',
+    'deletions',
+    'cdr3_nt',
+    'cdr3_num_nts',
+    'cdr3_aa',
+    'uniques',
+    'instances',
+    'copies',
+    'germline',
+    'parent_id',
+    'avg_v_identity',
+    'top_copy_seq',
+]
+
+
+def _strings(rng, alphabet, lengths):
+    '''
+    Returns random strings over ``alphabet`` with the given ``lengths``.
+
+    '''
+    width = max(lengths.max(initial=0), 1)
+    chars = alphabet[rng.integers(0, len(alphabet), (len(lengths), width))]
+    # Trailing null bytes are dropped when decoding the fixed-width strings
+    chars[np.arange(width) >= lengths[:, None]] = 0
+    return chars.view(f'S{width}').ravel().astype(str)
+
+
+def _genes(rng, names, size):
+    '''
+    Returns ``size`` genes drawn from ``names`` with Zipf-distributed usage.
+
+    '''
+    weights = 1 / np.arange(1, len(names) + 1)
+    return np.array(names)[
+        rng.choice(len(names), size, p=weights / weights.sum())
+    ]
+
+
+class Repertoire:
+    '''
+    A synthetic repertoire of ``replicates`` replicates split evenly among
+    ``subjects`` subjects.  Every clone of a subject has fixed genes and
+    CDR3, and a fraction ``overlap`` of each replicate's clones are shared
+    by all replicates of its subject.  A fraction ``public`` of clones reuse
+    a CDR3 from a small set shared by all subjects, so clones also overlap
+    across subjects when defined by CDR3.  Copy numbers follow a power law
+    with exponent ``alpha``.
+
+    Parameters
+    ----------
+    replicates : int
+        The number of replicates.
+    clones : int
+        The number of clones in each replicate.
+    subjects : int or None
+        The number of subjects.  Defaults to one for every two replicates.
+    alpha : float
+        The exponent of the Zipf distribution of copy numbers, which must be
+        greater than one.  Smaller values give more large clones.
+    max_copies : int
+        The largest copy number of any clone.
+    overlap : float
+        The fraction of each replicate's clones shared with the other
+        replicates of its subject.
+    public : float
+        The fraction of clones with a CDR3 shared across subjects.
+    v_genes : int
+        The number of distinct V genes.
+    j_genes : int
+        The number of distinct J genes.
+    seed : int
+        The seed of the random number generator.
+
+    Attributes
+    ----------
+    df : pd.DataFrame
+        One row per clone in each replicate with the ``POOLED_COLUMNS`` and
+        ``replicate_name``.
+    metadata : pd.DataFrame
+        The metadata of each replicate.
+
+    '''
+
+    def __init__(
+        self,
+        replicates=8,
+        clones=2000,
+        subjects=None,
+        alpha=2.0,
+        max_copies=100000,
+        overlap=0.3,
+        public=0.05,
+        v_genes=48,
+        j_genes=6,
+        seed=0,
+    ):
+        rng = np.random.default_rng(seed)
+        subjects = subjects or max(replicates // 2, 1)
+        assert 1 <= subjects <= replicates
+        assert alpha > 1 and 0 <= overlap <= 1 and 0 <= public <= 1
+
+        subject_of = np.arange(replicates) * subjects // replicates
+        rep_number = np.arange(replicates) - np.searchsorted(
+            subject_of, subject_of
+        )
+        subject_names = np.array([f'S{s:04d}' for s in range(subjects)])
+        self.metadata = pd.DataFrame(
+            {
+                'replicate_name': [
+                    f'{subject_names[s]}_rep{r + 1}'
+                    for s, r in zip(subject_of, rep_number)
+                ],
+                'subject': subject_names[subject_of],
+                'biological_sample': subject_names[subject_of],
+                'disease': np.where(subject_of % 2, 'T1D', 'HC'),
+            }
+        )
+
+        # Each subject has a block of shared clone IDs followed by a block
+        # of private clone IDs for each of its replicates
+        shared = int(round(clones * overlap))
+        private = clones - shared
+        per_subject = np.bincount(subject_of, minlength=subjects)
+        subject_start = np.concatenate(
+            [[0], np.cumsum(shared + private * per_subject)]
+        )
+        rows = np.concatenate(
+            [
+                np.concatenate(
+                    [
+                        subject_start[s] + np.arange(shared),
+                        subject_start[s]
+                        + shared
+                        + private * r
+                        + np.arange(private),
+                    ]
+                )
+                for s, r in zip(subject_of, rep_number)
+            ]
+        ).astype(np.int64)
+        replicate = np.repeat(np.arange(replicates), clones)
+
+        n_clones = subject_start[-1]
+        aa_lengths = rng.integers(5, 25, n_clones)
+        cdr3_aa = _strings(rng, AMINO_ACIDS, aa_lengths)
+        public_cdr3s = _strings(rng, AMINO_ACIDS, rng.integers(5, 25, 500))
+        is_public = rng.random(n_clones) < public
+        cdr3_aa[is_public] = public_cdr3s[
+            rng.integers(0, len(public_cdr3s), is_public.sum())
+        ]
+        aa_lengths = np.char.str_len(cdr3_aa)
+        functional = rng.random(n_clones) < 0.87
+        v_names = [f'IGHV{i // 4 + 1}-{i % 4 + 1}' for i in range(v_genes)]
+        j_names = [f'IGHJ{i + 1}' for i in range(j_genes)]
+
+        n_rows = len(rows)
+        copies = np.minimum(rng.zipf(alpha, n_rows), max_copies)
+        instances = rng.integers(1, copies + 1)
+        self.df = pd.DataFrame(
+            {
+                'clone_id': rows + 1,
+                'subject': subject_names[subject_of[replicate]],
+                'v_gene': _genes(rng, v_names, n_clones)[rows],
+                'j_gene': _genes(rng, j_names, n_clones)[rows],
+                'functional': np.where(functional, 'T', 'F')[rows],
+                'insertions': np.nan,
+                'deletions': np.nan,
+                'cdr3_nt': _strings(rng, NUCLEOTIDES, 3 * aa_lengths)[rows],
+                'cdr3_num_nts': 3 * aa_lengths[rows],
+                'cdr3_aa': cdr3_aa[rows],
+                'uniques': rng.integers(1, instances + 1),
+                'instances': instances,
+                'copies': copies,
+                'germline': 'ACGT',
+                'parent_id': np.nan,
+                'avg_v_identity': np.where(
+                    rng.random(n_rows) < 0.3,
+                    1.0,
+                    rng.uniform(0.7, 1, n_rows).round(4),
+                ),
+                'top_copy_seq': _strings(
+                    rng, NUCLEOTIDES, np.full(n_rows, 12)
+                ),
+                'replicate_name': self.metadata.replicate_name.values[
+                    replicate
+                ],
+            }
+        )
+        self._rng = rng
+
+    def write_pooled(self, path):
+        '''
+        Writes one ``db.<replicate>.pooled.tsv`` per replicate and a
+        ``metadata.tsv`` to ``path``.
+
+        '''
+        os.makedirs(path, exist_ok=True)
+        for name, rdf in self.df.groupby('replicate_name', sort=False):
+            rdf[POOLED_COLUMNS].to_csv(
+                os.path.join(path, f'db.{name}.pooled.tsv'),
+                sep='\t',
+                index=False,
+            )
+        self.metadata.to_csv(
+            os.path.join(path, 'metadata.tsv'), sep='\t', index=False
+        )
+
+    def write_igblast(self, path, reads=None):
+        '''
+        Writes one IgBLAST TSV per replicate to ``path`` with ``reads`` reads
+        sampled from the replicate's clones in proportion to their copies.
+        Defaults to one read per clone.
+
+        '''
+        os.makedirs(path, exist_ok=True)
+        for i, (name, rdf) in enumerate(
+            self.df.groupby('replicate_name', sort=False)
+        ):
+            n = reads or len(rdf)
+            weights = rdf.copies.values / rdf.copies.sum()
+            sampled = rdf.iloc[self._rng.choice(len(rdf), n, p=weights)]
+            alleles = self._rng.integers(1, 3, n)
+            subject, rep = name.rsplit('_rep', 1)
+            pd.DataFrame(
+                {
+                    'sequence_id': range(n),
+                    'v_call': sampled.v_gene.values
+                    + '*0'
+                    + alleles.astype(str),
+                    'j_call': sampled.j_gene.values + '*01',
+                    'junction_aa': sampled.cdr3_aa.values,
+                    'productive': sampled.functional.values,
+                    'v_identity': (100 * sampled.avg_v_identity.values).round(
+                        3
+                    ),
+                    'junction_length': sampled.cdr3_num_nts.values,
+                    'junction': sampled.cdr3_nt.values,
+                }
+            ).to_csv(
+                os.path.join(
+                    path,
+                    f'2022-01-{i % 28 + 1:02d}-human-IGH-{subject}-rep{rep}'
+                    '.tsv',
+                ),
+                sep='\t',
+                index=False,
+            )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser('Generate a synthetic repertoire')
+    parser.add_argument('path')
+    parser.add_argument('--replicates', type=int, default=8)
+    parser.add_argument('--clones', type=int, default=2000)
+    parser.add_argument('--subjects', type=int)
+    parser.add_argument('--alpha', type=float, default=2.0)
+    parser.add_argument('--overlap', type=float, default=0.3)
+    parser.add_argument('--public', type=float, default=0.05)
+    parser.add_argument('--v-genes', type=int, default=48)
+    parser.add_argument('--j-genes', type=int, default=6)
+    parser.add_argument('--igblast-reads', type=int)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    repertoire = Repertoire(
+        replicates=args.replicates,
+        clones=args.clones,
+        subjects=args.subjects,
+        alpha=args.alpha,
+        overlap=args.overlap,
+        public=args.public,
+        v_genes=args.v_genes,
+        j_genes=args.j_genes,
+        seed=args.seed,
+    )
+    hu.logger.info(f'Writing {len(repertoire.df)} clones to {args.path}')
+    repertoire.write_pooled(args.path)
+    repertoire.write_igblast(
+        os.path.join(args.path, 'igblast'), args.igblast_reads
+    )
@@ -1,3 +1,14 @@
-from hicutils.core import filters, io, metadata, pooling  # noqa: F401
+from hicutils.core import (  # noqa: F401
+    cdr3,
+    clustering,
+    diversity,
+    filters,
+    gene_usage,
+    io,
+    metadata,
+    overlap,
+    pooling,
+    sampling,
+)
 from hicutils.core.log import logger
 import hicutils.plots as plots  # noqa: F401
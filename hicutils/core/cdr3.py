@@ -0,0 +1,201 @@
+import numpy as np
+import pandas as pd
+
+from .overlap import _factorize
+
+
+IGNORED_CHARACTERS = b'.-'
+
+
+class PositionMatrices:
+    '''
+    Position count matrices of CDR3 sequences for every CDR3 length and,
+    optionally, every pool.  All matrices are built in a single pass over a
+    fixed-width byte array of the distinct CDR3s, so logos for any length or
+    pool can be produced without rescanning the data.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        The DataFrame to use as the source of CDR3 information.
+    by : str
+        Either ``cdr3_aa`` for amino-acids or ``cdr3_nt`` for nucleotides.
+    pool : str or list(str) or None
+        The column(s) defining each pool.  If ``None``, all rows are treated
+        as one pool.
+    size_metric : str
+        The weight of each CDR3.  Must be one of ``clones``, ``copies``, or
+        ``uniques``.  With ``clones`` each clone is counted once per pool.
+
+    Attributes
+    ----------
+    counts : pd.DataFrame
+        The weighted count of each character (columns) indexed by pool,
+        ``length``, and ``pos``.
+
+    '''
+
+    def __init__(self, df, by, pool=None, size_metric='clones'):
+        assert by in ('cdr3_aa', 'cdr3_nt')
+        assert size_metric in ('clones', 'copies', 'uniques')
+        self.pool = [] if pool is None else list(np.atleast_1d(pool))
+
+        if size_metric == 'clones':
+            df = df.drop_duplicates([*self.pool, 'clone_id'])
+        sizes = df.groupby([*self.pool, by], observed=True)[size_metric].sum()
+
+        seqs = sizes.index.get_level_values(by).astype(str)
+        groups = sizes.index.to_frame(index=False).drop(columns=by)
+        groups['length'] = seqs.str.len().values
+        codes, labels = _factorize(groups, [*self.pool, 'length'])
+        lengths = labels.get_level_values('length').values
+
+        width = max(lengths.max(initial=0), 1)
+        chars = (
+            np.array(seqs, dtype=f'S{width}')
+            .view(np.uint8)
+            .reshape(len(seqs), width)
+        )
+        rows, positions = np.nonzero(chars)
+        chars = chars[rows, positions]
+        used = np.setdiff1d(
+            np.unique(chars), np.frombuffer(IGNORED_CHARACTERS, np.uint8)
+        )
+        lookup = np.full(256, len(used))
+        lookup[used] = np.arange(len(used))
+
+        # One bin per (group, position, character) with ignored characters
+        # falling into a trailing bin which is discarded
+        bins = len(used) + 1
+        counts = np.bincount(
+            (codes[rows] * width + positions) * bins + lookup[chars],
+            weights=sizes.values[rows].astype(np.float64),
+            minlength=len(labels) * width * bins,
+        ).reshape(len(labels) * width, bins)[:, :-1]
+
+        group_index = np.repeat(np.arange(len(labels)), width)
+        position_index = np.tile(np.arange(width), len(labels))
+        keep = position_index < lengths[group_index]
+        index = labels[group_index[keep]].to_frame(index=False)
+        index['pos'] = position_index[keep]
+        self.counts = pd.DataFrame(
+            counts[keep],
+            index=pd.MultiIndex.from_frame(index),
+            columns=[chr(c) for c in used],
+        )
+
+    def lengths(self, pool_value=None):
+        '''
+        Returns the CDR3 lengths which occur, optionally limited to the pool
+        ``pool_value``.
+
+        '''
+        return (
+            self._select(pool_value)
+            .index.get_level_values('length')
+            .unique()
+            .sort_values()
+        )
+
+    def _select(self, pool_value=None):
+        if not self.pool:
+            assert pool_value is None
+            return self.counts
+        return self.counts.xs(
+            tuple(np.atleast_1d(pool_value)), level=self.pool
+        )
+
+    def count_matrix(self, length, pool_value=None):
+        '''
+        Returns the position count matrix for CDR3s of ``length`` in the pool
+        ``pool_value``.  Rows are positions and columns are the characters
+        which occur at any position.
+
+        '''
+        counts = self._select(pool_value).xs(length, level='length')
+        return counts.loc[:, counts.sum() > 0]
+
+    def frequency_matrix(self, length, pool_value=None):
+        '''
+        Returns the position frequency matrix for CDR3s of ``length`` in the
+        pool ``pool_value`` where each position sums to one.
+
+        '''
+        counts = self.count_matrix(length, pool_value)
+        return counts.div(counts.sum(axis=1), axis=0)
+
+
+class Spectratypes:
+    '''
+    CDR3 length distributions (spectratypes) of every pool.  Each row is
+    binned by pool and ``cdr3_num_nts`` once so histograms of any size metric
+    and the top clones of every pool are computed with array operations
+    rather than per-pool grouping.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        The DataFrame to use as the source of CDR3 lengths.
+    pool : str or list(str) or None
+        The column(s) defining each pool.  If ``None``, all rows are treated
+        as one pool.
+
+    '''
+
+    def __init__(self, df, pool=None):
+        self.df = df
+        self.pool = [] if pool is None else list(np.atleast_1d(pool))
+        if self.pool:
+            codes, self.pools = _factorize(df, self.pool)
+        else:
+            codes, self.pools = np.zeros(len(df), dtype=np.int64), None
+        lengths = df['cdr3_num_nts'].values.astype(np.float64)
+        self._keep = (codes >= 0) & ~np.isnan(lengths)
+        self.codes = codes
+        lengths = np.where(self._keep, lengths, 0).astype(np.int64)
+
+        self._width = lengths.max(initial=0) + 1
+        self._size = (len(self.pools) if self.pool else 1) * self._width
+        self._bins = (codes * self._width + lengths)[self._keep]
+        self._observed = np.flatnonzero(
+            np.bincount(self._bins, minlength=self._size)
+        )
+
+    def histogram(self, size_metric, normalize=False):
+        '''
+        Returns a tidy ``pd.DataFrame`` with the total ``size_metric`` of each
+        pool and CDR3 length which occurs.  If ``normalize`` is ``True``, each
+        pool sums to one.
+
+        '''
+        weights = self.df[size_metric].values[self._keep].astype(np.float64)
+        sums = np.bincount(
+            self._bins, weights=np.nan_to_num(weights), minlength=self._size
+        )[self._observed]
+        pools, lengths = np.divmod(self._observed, self._width)
+        if normalize:
+            totals = np.bincount(pools, weights=sums)
+            sums = sums / totals[pools]
+
+        if self.pool:
+            table = self.pools[pools].to_frame(index=False)
+        else:
+            table = pd.DataFrame(index=range(len(lengths)))
+        table['cdr3_num_nts'] = lengths
+        table[size_metric] = sums
+        return table
+
+    def top(self, n, size_metric):
+        '''
+        Returns the rows of the ``n`` largest clones by ``size_metric`` in
+        each pool, ordered by pool and then by descending size.  Ties are
+        broken by row order.
+
+        '''
+        keep = np.flatnonzero(self.codes >= 0)
+        sizes = self.df[size_metric].values[keep]
+        codes = self.codes[keep]
+        order = np.lexsort((-sizes, codes))
+        starts = np.searchsorted(codes[order], codes[order])
+        ranks = np.arange(len(order)) - starts
+        return self.df.iloc[keep[order[ranks < n]]]
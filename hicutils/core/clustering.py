@@ -0,0 +1,141 @@
+import numpy as np
+import pandas as pd
+from scipy.cluster import hierarchy
+from scipy.spatial import distance
+
+
+# The number of rows compared to the sampled rows at once when approximating
+_CHUNK_SIZE = 4096
+
+
+def _approximate_leaves(values, method, metric, sample, rng):
+    '''
+    Returns an ordering of the rows of ``values`` by clustering a random
+    subsample of ``sample`` rows with optimal leaf ordering and placing every
+    other row after its nearest sampled row.
+
+    '''
+    chosen = np.sort(rng.choice(len(values), sample, replace=False))
+    linkage = hierarchy.linkage(
+        values[chosen], method=method, metric=metric, optimal_ordering=True
+    )
+    ranks = np.empty(sample, dtype=np.int64)
+    ranks[hierarchy.leaves_list(linkage)] = np.arange(sample)
+
+    nearest = np.empty(len(values), dtype=np.int64)
+    distances = np.empty(len(values))
+    for start in range(0, len(values), _CHUNK_SIZE):
+        rows = slice(start, start + _CHUNK_SIZE)
+        chunk = distance.cdist(values[rows], values[chosen], metric=metric)
+        nearest[rows] = chunk.argmin(axis=1)
+        distances[rows] = chunk.min(axis=1)
+    return np.lexsort((distances, ranks[nearest]))
+
+
+class ClusterOrder:
+    '''
+    Hierarchical clustering of the rows and columns of a matrix, computed
+    separately from rendering.  Linkages and leaf orders are computed on first
+    use and cached, so the same ``ClusterOrder`` can be passed to repeated
+    heatmap calls with different normalization or cutoffs without clustering
+    again.
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        The matrix to cluster.
+    method : str
+        The linkage method passed to ``scipy.cluster.hierarchy.linkage``.
+        Defaults to ``average``, as used by ``sns.clustermap``.
+    metric : str
+        The distance metric.  Defaults to ``euclidean``.
+    sample : int or None
+        If specified and an axis has more than ``sample`` labels, its order is
+        approximated by clustering a random subsample of ``sample`` labels
+        with optimal leaf ordering and placing each remaining label after its
+        nearest sampled label.  No linkage is available for approximated axes.
+    seed : int or None
+        The seed used to choose the subsample.
+
+    '''
+
+    def __init__(
+        self,
+        data,
+        method='average',
+        metric='euclidean',
+        sample=None,
+        seed=None,
+    ):
+        self.data = data
+        self.method = method
+        self.metric = metric
+        self.sample = sample
+        self.seed = seed
+        self._linkages = {}
+        self._leaves = {}
+
+    def labels(self, by):
+        '''
+        Returns the labels of the ``rows`` or ``cols`` in their original
+        order.
+
+        '''
+        assert by in ('rows', 'cols')
+        return self.data.index if by == 'rows' else self.data.columns
+
+    def _values(self, by):
+        values = self.data.values.astype(np.float64)
+        return values if by == 'rows' else values.T
+
+    def is_approximate(self, by):
+        '''
+        Returns ``True`` if the order of the ``rows`` or ``cols`` is
+        approximated from a subsample.
+
+        '''
+        return self.sample is not None and len(self.labels(by)) > self.sample
+
+    def linkage(self, by):
+        '''
+        Returns the linkage matrix of the ``rows`` or ``cols``, or ``None`` if
+        the axis is approximated.
+
+        '''
+        if self.is_approximate(by):
+            return None
+        if by not in self._linkages:
+            self._linkages[by] = hierarchy.linkage(
+                self._values(by), method=self.method, metric=self.metric
+            )
+        return self._linkages[by]
+
+    def leaves(self, by):
+        '''
+        Returns the labels of the ``rows`` or ``cols`` in clustered order.
+
+        '''
+        if by not in self._leaves:
+            if self.is_approximate(by):
+                order = _approximate_leaves(
+                    self._values(by),
+                    self.method,
+                    self.metric,
+                    self.sample,
+                    np.random.default_rng(self.seed),
+                )
+            else:
+                order = hierarchy.leaves_list(self.linkage(by))
+            self._leaves[by] = self.labels(by)[order]
+        return self._leaves[by]
+
+    def order(self, by, labels):
+        '''
+        Returns ``labels`` sorted by the clustered order of the ``rows`` or
+        ``cols``.  Labels which were not clustered are placed last in their
+        given order.
+
+        '''
+        labels = pd.Index(labels)
+        leaves = self.leaves(by)
+        return leaves[leaves.isin(labels)].append(labels[~labels.isin(leaves)])
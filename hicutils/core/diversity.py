@@ -0,0 +1,261 @@
+import numpy as np
+import pandas as pd
+
+from .overlap import _factorize
+
+
+class RankedSizes:
+    '''
+    Clone sizes ranked from largest to smallest within each pool.  The sizes
+    of all pools are ordered by one global sort so diversity metrics and
+    rank-range totals for every pool are computed from shared cumulative sums
+    without sorting each pool separately.  Each row of ``df`` is treated as a
+    clone; use ``pool_by`` first to merge clones across replicates.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        The DataFrame from which to rank clones.
+    pool : str or list(str)
+        The column(s) defining each pool.
+    size : str
+        The size metric of each clone.  Defaults to ``copies``.
+
+    Attributes
+    ----------
+    sizes : np.ndarray
+        The clone sizes ordered by pool then by descending size.
+    pools : pd.Index
+        The pool labels.
+    indptr : np.ndarray
+        The sizes of pool ``i`` are ``sizes[indptr[i]:indptr[i + 1]]``.
+
+    '''
+
+    def __init__(self, df, pool, size='copies'):
+        codes, self.pools = _factorize(df, pool)
+        keep = codes >= 0
+        codes, sizes = codes[keep], df[size].values[keep]
+        order = np.lexsort((-sizes, codes))
+        self.sizes = sizes[order]
+        self.indptr = np.concatenate(
+            [[0], np.cumsum(np.bincount(codes, minlength=len(self.pools)))]
+        )
+        self._cumsum = np.concatenate([[0], np.cumsum(self.sizes)])
+
+    def clones(self):
+        '''
+        Returns the number of clones in each pool.
+
+        '''
+        return np.diff(self.indptr)
+
+    def totals(self):
+        '''
+        Returns the total size of each pool.
+
+        '''
+        return self.top(None)
+
+    def top(self, n):
+        '''
+        Returns the total size of the ``n`` largest clones in each pool, or of
+        all clones if ``n`` is ``None``.
+
+        '''
+        counts = self.clones()
+        if n is not None:
+            counts = np.minimum(counts, n)
+        start = self.indptr[:-1]
+        return self._cumsum[start + counts] - self._cumsum[start]
+
+    def range_totals(self, intervals):
+        '''
+        Returns an array with one row per pool and one column per rank range
+        ``intervals[i]`` to ``intervals[i + 1]`` containing the total size of
+        the clones ranked in that range.  The final column contains all clones
+        ranked at or past ``intervals[-1]``.
+
+        '''
+        return np.diff(
+            np.column_stack([self.top(n) for n in [*intervals, None]]),
+            axis=1,
+        )
+
+    def _reduce(self, values):
+        # Sums ``values`` (aligned with ``sizes``) within each pool
+        values = np.append(np.asarray(values, dtype=np.float64), 0)
+        return np.add.reduceat(values, self.indptr[:-1]) * (self.clones() > 0)
+
+    def metrics(self, dn=(10, 20, 50), hill=(0, 1, 2)):
+        '''
+        Computes diversity and clonality metrics for each pool.
+
+        Parameters
+        ----------
+        dn : list(int)
+            The ``n`` for each Dn index: the fraction of the pool's total size
+            in its ``n`` largest clones.
+        hill : list(float)
+            The orders ``q`` of the Hill numbers to compute.
+
+        Returns
+        -------
+        A ``pd.DataFrame`` indexed by pool with the columns:
+
+        * ``clones``: The number of clones.
+        * ``d{n}``: The Dn index for each value of ``dn``.
+        * ``shannon``: The Shannon entropy (natural log).
+        * ``simpson``: Simpson's index, the probability two randomly chosen
+          members belong to the same clone (with replacement).
+        * ``gini``: The Gini coefficient of clone sizes.
+        * ``chao1``: The bias-corrected Chao1 richness estimate.
+        * ``clonality``: One minus Pielou's evenness, ``1 - shannon /
+          log(clones)``.
+        * ``hill_{q}``: The Hill number of order ``q`` for each value of
+          ``hill``.
+
+        '''
+        clones = self.clones()
+        totals = self.totals().astype(np.float64)
+        pool_totals = np.repeat(totals, clones)
+        p = self.sizes / pool_totals
+
+        metrics = {'clones': clones}
+        for n in dn:
+            metrics[f'd{n}'] = self.top(n) / totals
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            shannon = -self._reduce(np.where(p > 0, p * np.log(p), 0))
+            metrics['shannon'] = shannon
+            metrics['simpson'] = self._reduce(p**2)
+
+            # Ranks from smallest (1) to largest within each pool
+            ranks = np.repeat(self.indptr[1:], clones) - np.arange(len(p))
+            metrics['gini'] = (
+                2 * self._reduce(ranks * self.sizes) / (clones * totals)
+                - (clones + 1) / clones
+            )
+
+            singletons = self._reduce(self.sizes == 1)
+            doubletons = self._reduce(self.sizes == 2)
+            metrics['chao1'] = clones + singletons * (singletons - 1) / (
+                2 * (doubletons + 1)
+            )
+            metrics['clonality'] = 1 - shannon / np.log(clones)
+
+            for q in hill:
+                if q == 1:
+                    metrics[f'hill_{q}'] = np.exp(shannon)
+                else:
+                    metrics[f'hill_{q}'] = self._reduce(
+                        np.where(p > 0, p**q, 0)
+                    ) ** (1 / (1 - q))
+
+        return pd.DataFrame(metrics, index=self.pools)
+
+
+def diversity(df, pool, size='copies', dn=(10, 20, 50), hill=(0, 1, 2)):
+    '''
+    Computes diversity and clonality metrics for each pool in ``df``.  See
+    ``RankedSizes.metrics`` for the metrics returned.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        The DataFrame from which to compute diversity.
+    pool : str or list(str)
+        The column(s) defining each pool.
+    size : str
+        The size metric of each clone.  Defaults to ``copies``.
+    dn : list(int)
+        The ``n`` for each Dn index.
+    hill : list(float)
+        The orders ``q`` of the Hill numbers to compute.
+
+    Returns
+    -------
+    A ``pd.DataFrame`` of metrics indexed by pool.
+
+    '''
+    return RankedSizes(df, pool, size).metrics(dn=dn, hill=hill)
+
+
+def _log_edges(sizes, bins):
+    # Integer edges, spaced logarithmically, which cover every size
+    low, high = sizes.min(initial=1), sizes.max(initial=1)
+    return np.unique(np.ceil(np.geomspace(low, high + 1, bins + 1))).astype(
+        np.int64
+    )
+
+
+def size_histogram(
+    df, pool=None, size='copies', clone_features='clone_id', bins=None
+):
+    '''
+    Counts the number of clones of each size, optionally within each pool.
+    All pools are counted by a single ``np.bincount`` and only non-empty bins
+    are returned, so the result stays small no matter how large the largest
+    clone is.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        The DataFrame from which to count clone sizes.
+    pool : str or list(str) or None
+        The column(s) defining each pool.  If ``None``, all rows are counted
+        together.
+    size : str
+        The size metric of each clone.  Defaults to ``copies``.
+    clone_features : str or list(str)
+        The feature(s) defining a clone.  A clone is counted once per pool and
+        size.  Defaults to ``clone_id``.
+    bins : int, list(int), or None
+        If ``None``, each distinct size is its own bin.  If an int, that many
+        logarithmically spaced bins spanning all sizes are used (fewer if
+        small sizes would repeat an integer edge).  If a list, the bin edges
+        where each bin includes its left edge but not its right.
+
+    Returns
+    -------
+    A ``pd.Series`` of clone counts indexed by pool (if specified) and
+    ``size``.  With ``bins`` the ``size`` level is a ``pd.IntervalIndex``
+    closed on the left.
+
+    '''
+    pool = [] if pool is None else list(np.atleast_1d(pool))
+    df = df.drop_duplicates(
+        [*pool, *np.atleast_1d(clone_features), size]
+    ).dropna(subset=[size])
+    if pool:
+        codes, pools = _factorize(df, pool)
+    else:
+        codes, pools = np.zeros(len(df), dtype=np.int64), pd.Index([0])
+    sizes = df[size].values
+    keep = codes >= 0
+    codes, sizes = codes[keep], sizes[keep]
+
+    if bins is None:
+        labels, bin_codes = np.unique(sizes, return_inverse=True)
+    else:
+        edges = (
+            _log_edges(sizes, bins) if np.isscalar(bins) else np.asarray(bins)
+        )
+        labels = pd.IntervalIndex.from_breaks(edges, closed='left')
+        bin_codes = np.searchsorted(edges, sizes, side='right') - 1
+        inside = (bin_codes >= 0) & (bin_codes < len(labels))
+        codes, bin_codes = codes[inside], bin_codes[inside]
+
+    counts = np.bincount(
+        codes * len(labels) + bin_codes, minlength=len(pools) * len(labels)
+    )
+    (nonzero,) = np.nonzero(counts)
+    pool_codes, bin_codes = np.divmod(nonzero, len(labels))
+    sizes = pd.Index(labels[bin_codes], name='size')
+    if pool:
+        index = pools[pool_codes].to_frame(index=False)
+        index['size'] = sizes
+        index = pd.MultiIndex.from_frame(index)
+    else:
+        index = sizes
+    return pd.Series(counts[nonzero], index=index, name='clones')
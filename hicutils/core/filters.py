@@ -1,4 +1,251 @@
 import numpy as np
+import pandas as pd
+
+
+class _Codes(dict):
+    '''
+    Lazily factorized integer codes for columns of ``df`` shared between
+    filters.  Missing values have a code of -1.
+
+    '''
+
+    def __init__(self, df):
+        super().__init__()
+        self.df = df
+        self.labels = {}
+
+    def __getitem__(self, column):
+        # Lists of columns are cached under the equivalent tuple
+        if isinstance(column, list):
+            column = tuple(column)
+        return super().__getitem__(column)
+
+    def __missing__(self, column):
+        if isinstance(column, tuple):
+            # Combine the codes of several columns into one code per distinct
+            # combination
+            combined = np.zeros(len(self.df), dtype=np.int64)
+            missing = np.zeros(len(self.df), dtype=bool)
+            for c in column:
+                combined = combined * _size(self[c]) + self[c]
+                missing |= self[c] < 0
+            codes = np.unique(combined, return_inverse=True)[1]
+            self[column] = np.where(missing, -1, codes)
+        else:
+            self[column], self.labels[column] = pd.factorize(self.df[column])
+        return self[column]
+
+
+def _size(codes):
+    return codes.max(initial=-1) + 1
+
+
+def _apply(df, mask_func, *args, **kwargs):
+    keep = np.ones(len(df), dtype=bool)
+    return df[mask_func(df, keep, _Codes(df), *args, **kwargs)]
+
+
+def _overall_copies_mask(df, keep, codes, copies, field='clone_id'):
+    clones = codes[field]
+    keep = keep & (clones >= 0)
+    totals = np.bincount(
+        clones[keep], weights=df.copies.values[keep], minlength=_size(clones)
+    )
+    return keep & (totals[clones] >= copies)
+
+
+def _functional_mask(df, keep, codes, functional=True):
+    return keep & np.asarray(df.functional == ('T' if functional else 'F'))
+
+
+def _gene_frequency_mask(
+    df, keep, codes, min_frequency, by='subject', gene='v_gene', basis='clones'
+):
+    genes = codes[gene]
+    pools, clones = codes[by], codes['clone_id']
+    n_genes, n_clones = _size(genes), _size(clones)
+    keep = keep & (pools >= 0) & (genes >= 0)
+    pairs = pools * n_genes + genes
+
+    n_pairs = _size(pools) * n_genes
+    if basis == 'copies':
+        per_pair = np.bincount(
+            pairs[keep], weights=df.copies.values[keep], minlength=n_pairs
+        )
+    else:
+        # Unique clones for each (by, gene) pair
+        counted = keep & (clones >= 0)
+        unique = np.unique(pairs[counted] * n_clones + clones[counted])
+        per_pair = np.bincount(unique // n_clones, minlength=n_pairs)
+    per_pool = per_pair.reshape(-1, n_genes).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        frequency = per_pair / np.repeat(per_pool, n_genes)
+    return keep & (frequency[pairs] >= min_frequency)
+
+
+def _check_genes(gene, basis):
+    assert basis in ('clones', 'copies')
+    genes = [gene] if isinstance(gene, str) else list(gene)
+    assert genes and all(g in ('v_gene', 'j_gene') for g in genes)
+
+
+def _number_of_pools_mask(
+    df, keep, codes, pool, n, func='greater_equal', limit_to=None
+):
+    func = getattr(np, func)
+    clones, pools = codes['clone_id'], codes[pool]
+    n_pools = _size(pools)
+    present = keep & (pools >= 0) & (df.copies.values != 0)
+    if limit_to:
+        if isinstance(limit_to, str):
+            limit_to = [limit_to]
+        if not set(limit_to).issubset(df[pool][keep]):
+            raise KeyError(f'Pools not in overlap matrix: {limit_to}')
+        present &= np.asarray(df[pool].isin(limit_to))
+
+    keep = keep & (clones >= 0)
+    present &= keep
+    pairs = np.unique(clones[present] * n_pools + pools[present])
+    counts = np.bincount(pairs // max(n_pools, 1), minlength=_size(clones))
+    return keep & func(counts[clones], n)
+
+
+def _clone_index(df, keep, codes, pool, clone_feature, index):
+    if index is None:
+        return CloneIndex._from_codes(codes, pool, clone_feature, keep)
+    if (
+        index.pool != pool
+        or index.clone_feature != clone_feature
+        or not index._built_from(df)
+    ):
+        raise ValueError(
+            'The CloneIndex was not built from this DataFrame, pool, and '
+            'clone feature'
+        )
+    return index
+
+
+def _presence_mask(
+    df,
+    keep,
+    codes,
+    pool,
+    pool_value,
+    present=True,
+    index=None,
+    clone_feature='clone_id',
+):
+    index = _clone_index(df, keep, codes, pool, clone_feature, index)
+    if pool_value not in index:
+        raise KeyError(f'"{pool_value}" is not a value for pool "{pool}"')
+    found = index.rows_in([pool_value])
+    return keep & index.has_clone() & (found if present else ~found)
+
+
+def _contaminates_mask(
+    df, keep, codes, pool, pool_values, clone_feature, index=None
+):
+    index = _clone_index(df, keep, codes, pool, clone_feature, index)
+    return keep & ~index.rows_in(pool_values)
+
+
+class CloneIndex:
+    '''
+    An index of which clones occur in each pool of a DataFrame.  Clone values
+    are hashed to integer codes once and the codes of the clones in each pool
+    are stored as sorted arrays, so presence, absence, and contaminant queries
+    take a single pass over the rows without pivoting.  An index can be built
+    once and passed to ``filter_by_presence`` or
+    ``remove_potential_contaminates`` with ``index`` for repeated queries on
+    the same DataFrame.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        The DataFrame to index.
+    pool : str
+        The pool column.
+    clone_feature : str
+        The column defining a clone.  Defaults to ``clone_id``.
+
+    '''
+
+    def __init__(self, df, pool, clone_feature='clone_id'):
+        self._build(
+            _Codes(df), pool, clone_feature, np.ones(len(df), dtype=bool)
+        )
+
+    @classmethod
+    def _from_codes(cls, codes, pool, clone_feature, keep):
+        index = cls.__new__(cls)
+        index._build(codes, pool, clone_feature, keep)
+        return index
+
+    @staticmethod
+    def _sample(df, pool, clone_feature):
+        # The row labels and the pool and clone values of evenly spaced rows
+        # cheaply identify the DataFrame without hashing every row
+        rows = np.linspace(0, len(df) - 1, min(len(df), 64)).astype(np.int64)
+        return df.index, df[[pool, clone_feature]].iloc[rows]
+
+    def _built_from(self, df):
+        rows, values = self._sample(df, self.pool, self.clone_feature)
+        return (
+            len(df) == len(self.clones)
+            and (rows is self._rows or rows.equals(self._rows))
+            and values.equals(self._values)
+        )
+
+    def _build(self, codes, pool, clone_feature, keep):
+        self.pool, self.clone_feature = pool, clone_feature
+        self._rows, self._values = self._sample(codes.df, pool, clone_feature)
+        clones, pools = codes[clone_feature], codes[pool]
+        # Missing clone values are given their own trailing code
+        self.n_clones = _size(clones)
+        self.clones = np.where(clones < 0, self.n_clones, clones)
+
+        rows = keep & (pools >= 0)
+        keys = np.unique(
+            pools[rows].astype(np.int64) * (self.n_clones + 1)
+            + self.clones[rows]
+        )
+        self.pools = pd.Index(np.asarray(codes.labels[pool]))
+        self._indptr = np.searchsorted(
+            keys // (self.n_clones + 1), np.arange(len(self.pools) + 1)
+        )
+        self._members = keys % (self.n_clones + 1)
+
+    def __contains__(self, pool_value):
+        return len(self.members(pool_value)) > 0
+
+    def members(self, pool_value):
+        '''
+        Returns the sorted clone codes occurring in the pool ``pool_value``.
+
+        '''
+        loc = self.pools.get_indexer([pool_value])[0]
+        if loc < 0:
+            return self._members[:0]
+        start, end = self._indptr[loc], self._indptr[loc + 1]
+        return self._members[start:end]
+
+    def has_clone(self):
+        '''
+        Returns a boolean array of the rows with a non-missing clone feature.
+
+        '''
+        return self.clones < self.n_clones
+
+    def rows_in(self, pool_values):
+        '''
+        Returns a boolean array of the rows whose clone occurs in any of the
+        pools ``pool_values``.  Values which are not pools are ignored.
+
+        '''
+        member = np.zeros(self.n_clones + 1, dtype=bool)
+        for pool_value in pool_values:
+            member[self.members(pool_value)] = True
+        return member[self.clones]
 
 
 def filter_by_overall_copies(df, copies, field='clone_id'):
@@ -16,6 +263,8 @@ def filter_by_overall_copies(df, copies, field='clone_id'):
     copies : int
         The minimum copy number of each clone required to be included in the
         resulting DataFrame.
+    field : str
+        The column defining a clone.  Defaults to ``clone_id``.
 
     Returns
     -------
@@ -36,9 +285,7 @@ def filter_by_overall_copies(df, copies, field='clone_id'):
 
 
     '''
-    valid_clones = df.groupby(field).copies.sum() >= copies
-    valid_clones = valid_clones[valid_clones == True].index  # noqa: E712
-    return df[df.clone_id.isin(valid_clones)]
+    return _apply(df, _overall_copies_mask, copies, field)
 
 
 def filter_functional(df, functional=True):
@@ -61,17 +308,19 @@ def filter_functional(df, functional=True):
 
     '''
 
-    return df[df.functional == ('T' if functional else 'F')]
+    return _apply(df, _functional_mask, functional)
 
 
-def filter_by_gene_frequency(df, min_frequency, by='subject', gene='v_gene'):
+def filter_by_gene_frequency(
+    df, min_frequency, by='subject', gene='v_gene', basis='clones'
+):
     '''
     Removes clones in ``by`` (defaults to ``subject``) which have an overall
-    ``gene`` usage less than or equal to ``min_frequency``.
+    ``gene`` usage less than ``min_frequency``.
 
     For example, if ``min_frequency=0.05`` and ``by='subject'``, all clones
-    using a V-gene with a frequency less than or equal to 0.05 in a given
-    subject are removed.
+    using a V-gene with a frequency less than 0.05 in a given subject are
+    removed.  The order of the remaining rows is preserved.
 
     df : pd.DataFrame
         The DataFrame to filter.
@@ -79,30 +328,22 @@ def filter_by_gene_frequency(df, min_frequency, by='subject', gene='v_gene'):
         The minimum frequency of a gene in ``by`` that should be included.
     by : str
         The column on which to calculate frequency.  Defaults to ``subject``.
-    gene : str
-        The gene on which to filter.  Accepts ``v_gene`` or ``j_gene``
-        defaulting to ``j_gene``
+    gene : str or list(str)
+        The gene on which to filter.  Accepts ``v_gene`` (the default),
+        ``j_gene``, or ``['v_gene', 'j_gene']`` to filter on the frequency of
+        each V/J gene combination.
+    basis : str
+        How gene frequency is measured.  With ``clones`` (the default) each
+        distinct ``clone_id`` is counted once.  With ``copies`` the frequency
+        is the fraction of copies using the gene.
 
     Returns
     ------
     DataFrame filtered on gene frequency in ``by``.
 
     '''
-    assert gene in ('v_gene', 'j_gene')
-
-    def _filter_group(df):
-        pdf = df.groupby(gene).clone_id.nunique().to_frame().reset_index()
-        pdf.clone_id /= pdf.clone_id.sum()
-        valid_genes = pdf[pdf.clone_id >= min_frequency][gene]
-        return df[df[gene].isin(valid_genes)]
-
-    return df.groupby(by, group_keys=False).apply(_filter_group)
-
-
-def _overlap_pivot(df, pool):
-    return df.pivot_table(
-        index='clone_id', columns=pool, values='copies', aggfunc=np.sum
-    )
+    _check_genes(gene, basis)
+    return _apply(df, _gene_frequency_mask, min_frequency, by, gene, basis)
 
 
 def filter_number_of_pools(df, pool, n, func='greater_equal', limit_to=None):
@@ -129,16 +370,12 @@ def filter_number_of_pools(df, pool, n, func='greater_equal', limit_to=None):
 
     '''
 
-    func = getattr(np, func)
-    counts = _overlap_pivot(df, pool)
-    if limit_to:
-        counts = counts[limit_to]
-    counts = (counts / counts).sum(axis=1)
-    counts = set(counts[func(counts, n)].index)
-    return df[df.clone_id.isin(counts)]
+    return _apply(df, _number_of_pools_mask, pool, n, func, limit_to)
 
 
-def filter_by_presence(df, pool, pool_value):
+def filter_by_presence(
+    df, pool, pool_value, present=True, index=None, clone_feature='clone_id'
+):
     '''
     Filters clones based on presence in a given pool.
 
@@ -148,24 +385,28 @@ def filter_by_presence(df, pool, pool_value):
         The pool on which to filter.
     pool_value : str
         The pool value on which to filter.
+    present : bool
+        If ``True`` (the default) only clones occurring in ``pool_value`` are
+        included.  If ``False`` only clones absent from ``pool_value`` are
+        included.
+    index : CloneIndex, optional
+        A ``CloneIndex`` of ``df`` on ``pool`` and ``clone_feature`` to reuse
+        across calls.
+    clone_feature : str
+        The column defining a clone.  Defaults to ``clone_id``.
 
     Returns
     -------
-    DataFrame filtered by number of pools.
+    DataFrame filtered by presence in ``pool_value``.
 
     '''
-    if pool_value not in df[pool].unique():
-        raise KeyError(f'"{pool_value}" is not a value for pool "{pool}"')
-    overlap_df = df.pivot_table(
-        index='clone_id', columns=pool, values='copies', aggfunc=np.sum
-    ).fillna(0)
-
-    clone_ids = overlap_df[overlap_df[pool_value] > 0].index
-    return df[df.clone_id.isin(clone_ids)]
+    return _apply(
+        df, _presence_mask, pool, pool_value, present, index, clone_feature
+    )
 
 
 def remove_potential_contaminates(
-    df, pool, pool_values, clone_feature='cdr3_nt'
+    df, pool, pool_values, clone_feature='cdr3_nt', index=None
 ):
     '''
     Removes clones based on ``clone_feature`` (defaults to CDR3 NT) which occur
@@ -186,6 +427,9 @@ def remove_potential_contaminates(
         The clone feature to use for filtering.  For example ``cdr3_nt`` (the
         default) will use the CDR3 NT sequence as the basis for removing other
         clones.
+    index : CloneIndex, optional
+        A ``CloneIndex`` of ``df`` on ``pool`` and ``clone_feature`` to reuse
+        across calls.
 
     Returns
     -------
@@ -194,5 +438,111 @@ def remove_potential_contaminates(
 
     '''
 
-    remove_values = df[df[pool].isin(pool_values)][clone_feature].unique()
-    return df[~df[clone_feature].isin(remove_values)]
+    return _apply(
+        df, _contaminates_mask, pool, pool_values, clone_feature, index
+    )
+
+
+class FilterPipeline:
+    '''
+    Records filters and applies them lazily.  Each filter narrows a single
+    boolean mask over the original DataFrame rather than materializing a copy,
+    and integer codes for columns such as ``clone_id`` are computed once and
+    shared between filters.  The filtered DataFrame is only created by
+    ``apply`` and contains the same rows as chaining the equivalent functions.
+
+    Examples
+    --------
+    .. code-block:: python
+
+        >>> pipeline = (
+        ...     FilterPipeline()
+        ...     .filter_functional()
+        ...     .filter_by_overall_copies(5)
+        ...     .remove_potential_contaminates('subject', ['Water'])
+        ... )
+        >>> df = pipeline.apply(df)
+
+    '''
+
+    def __init__(self):
+        self.steps = []
+
+    def _add(self, mask_func, *args, **kwargs):
+        self.steps.append((mask_func, args, kwargs))
+        return self
+
+    def filter_by_overall_copies(self, copies, field='clone_id'):
+        '''
+        Adds ``filter_by_overall_copies`` to the pipeline.
+
+        '''
+        return self._add(_overall_copies_mask, copies, field)
+
+    def filter_functional(self, functional=True):
+        '''
+        Adds ``filter_functional`` to the pipeline.
+
+        '''
+        return self._add(_functional_mask, functional)
+
+    def filter_by_gene_frequency(
+        self, min_frequency, by='subject', gene='v_gene', basis='clones'
+    ):
+        '''
+        Adds ``filter_by_gene_frequency`` to the pipeline.
+
+        '''
+        _check_genes(gene, basis)
+        return self._add(_gene_frequency_mask, min_frequency, by, gene, basis)
+
+    def filter_number_of_pools(
+        self, pool, n, func='greater_equal', limit_to=None
+    ):
+        '''
+        Adds ``filter_number_of_pools`` to the pipeline.
+
+        '''
+        return self._add(_number_of_pools_mask, pool, n, func, limit_to)
+
+    def filter_by_presence(
+        self, pool, pool_value, present=True, clone_feature='clone_id'
+    ):
+        '''
+        Adds ``filter_by_presence`` to the pipeline.
+
+        '''
+        return self._add(
+            _presence_mask,
+            pool,
+            pool_value,
+            present,
+            clone_feature=clone_feature,
+        )
+
+    def remove_potential_contaminates(
+        self, pool, pool_values, clone_feature='cdr3_nt'
+    ):
+        '''
+        Adds ``remove_potential_contaminates`` to the pipeline.
+
+        '''
+        return self._add(_contaminates_mask, pool, pool_values, clone_feature)
+
+    def mask(self, df):
+        '''
+        Returns a boolean array of the rows in ``df`` which pass every filter.
+
+        '''
+        keep = np.ones(len(df), dtype=bool)
+        codes = _Codes(df)
+        for mask_func, args, kwargs in self.steps:
+            keep = mask_func(df, keep, codes, *args, **kwargs)
+        return keep
+
+    def apply(self, df):
+        '''
+        Returns the rows of ``df`` which pass every filter.
+
+        '''
+        return df[self.mask(df)]
@@ -0,0 +1,141 @@
+import numpy as np
+import pandas as pd
+
+from .overlap import _factorize
+
+
+SIZE_METRICS = ('clones', 'copies', 'uniques')
+GENES = ('v_gene', 'j_gene')
+
+
+class GeneUsage:
+    '''
+    V-gene, J-gene, and V/J pair usage of every pool for every size metric.
+    All sizes are summed in a single grouped pass over pool, V gene and J
+    gene, and the usage of each gene or pair is derived from that table and
+    cached, so the same ``GeneUsage`` can back any number of gene plots.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        The DataFrame to use as the source of gene usage information.
+    pool : str or list(str)
+        The column(s) defining each pool.
+
+    Attributes
+    ----------
+    pairs : pd.DataFrame
+        The ``clones``, ``copies``, and ``uniques`` of each pool, V gene and J
+        gene, summed over rows.  ``unique_clones`` counts each clone once per
+        pool and V/J pair, and ``v_gene_clones`` and ``j_gene_clones`` count
+        each clone once per pool and V or J gene respectively, so summing them
+        over the other gene does not count a clone twice.  Missing genes are
+        kept so the usage of one gene includes rows missing the other.
+    pool_clones : pd.Series
+        The number of clones in each pool.
+
+    '''
+
+    def __init__(self, df, pool):
+        self.pool = list(np.atleast_1d(pool))
+        has_clone = df['clone_id'].notna().values
+
+        def first(*features):
+            # Flags the first row of each clone within the pool and features
+            duplicated = df.duplicated([*self.pool, 'clone_id', *features])
+            return (~duplicated.values & has_clone).astype(np.int64)
+
+        # Genes are grouped by their codes, where missing genes are -1, as
+        # missing categorical values cannot be kept as groups
+        pool_codes, pools = _factorize(df, self.pool)
+        codes, labels = {}, {}
+        for gene in GENES:
+            codes[gene], labels[gene] = pd.factorize(df[gene], sort=True)
+        keep = pool_codes >= 0
+        sizes = (
+            pd.DataFrame(
+                {
+                    'pool': pool_codes,
+                    **codes,
+                    'clones': df['clones'].values,
+                    'copies': df['copies'].values,
+                    'uniques': df['uniques'].values,
+                    'unique_clones': first(*GENES),
+                    **{f'{gene}_clones': first(gene) for gene in GENES},
+                }
+            )[keep]
+            .groupby(['pool', *GENES])
+            .sum()
+        )
+
+        index = pools[sizes.index.get_level_values('pool')].to_frame(
+            index=False
+        )
+        for gene in GENES:
+            index[gene] = pd.Index(labels[gene]).take(
+                sizes.index.get_level_values(gene),
+                allow_fill=True,
+                fill_value=np.nan,
+            )
+        self.pairs = sizes.set_axis(pd.MultiIndex.from_frame(index))
+        self.pool_clones = pd.Series(
+            np.bincount(
+                pool_codes[keep],
+                weights=first()[keep],
+                minlength=len(pools),
+            ).astype(np.int64),
+            index=pools,
+            name='clones',
+        )
+        self._counts = {}
+
+    def counts(self, gene, size_metric, unique_clones=True):
+        '''
+        Returns a ``pd.Series`` of the ``size_metric`` of each pool and
+        ``gene``, which may be ``v_gene``, ``j_gene``, or both for V/J pairs.
+        Genes which are missing are excluded.  If ``unique_clones`` is
+        ``True`` (the default) ``clones`` counts each distinct ``clone_id``
+        once, otherwise the ``clones`` column is summed over rows.
+
+        '''
+        genes = tuple(np.atleast_1d(gene))
+        assert genes and set(genes) <= set(GENES)
+        assert size_metric in SIZE_METRICS
+        unique_clones = unique_clones and size_metric == 'clones'
+        key = (genes, size_metric, unique_clones)
+        if key not in self._counts:
+            if not unique_clones:
+                column = size_metric
+            elif len(genes) == 1:
+                column = f'{genes[0]}_clones'
+            else:
+                column = 'unique_clones'
+            self._counts[key] = (
+                self.pairs[column]
+                .groupby(level=[*self.pool, *genes], observed=True)
+                .sum()
+                .sort_index()
+                .rename(size_metric)
+            )
+        return self._counts[key]
+
+    def frequency(self, gene, size_metric):
+        '''
+        Returns the counts of ``gene`` as a percentage of each pool's total.
+
+        '''
+        counts = self.counts(gene, size_metric)
+        totals = counts.groupby(level=self.pool, observed=True).transform(
+            'sum'
+        )
+        return 100 * counts / totals
+
+    def matrix(self, gene, size_metric, unique_clones=True):
+        '''
+        Returns the counts of ``gene`` as a ``pd.DataFrame`` with one row per
+        pool and one column per gene (or V/J pair).  Absent genes are zero.
+
+        '''
+        genes = list(np.atleast_1d(gene))
+        counts = self.counts(gene, size_metric, unique_clones)
+        return counts.unstack(genes).fillna(0)
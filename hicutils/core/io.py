@@ -1,4 +1,7 @@
+import functools
 import glob
+import hashlib
+import json
 import multiprocessing as mp
 import os
 import re
@@ -8,6 +11,7 @@ import zipfile
 
 import numpy as np
 import pandas as pd
+from pandas.api.types import union_categoricals
 import matplotlib.pyplot as plt
 
 from .log import logger
@@ -17,7 +21,153 @@ def _cols_without(df, s):
     return [c for c in df.columns if s not in c]
 
 
-def read_tsvs(path, features=tuple()):
+TSV_DTYPES = {
+    'subject': 'category',
+    'v_gene': 'category',
+    'j_gene': 'category',
+    'functional': 'category',
+    'cdr3_nt': 'category',
+    'cdr3_aa': 'category',
+    'cdr3_num_nts': np.int16,
+    'uniques': np.int32,
+    'instances': np.int32,
+    'copies': np.int32,
+    'avg_v_identity': np.float32,
+}
+
+
+def _read_tsv(fn, features, narrow_dtypes=False):
+    # Identities are narrowed only after deriving SHM so the derived columns
+    # match those read without narrow dtypes
+    df = pd.read_csv(
+        fn,
+        sep='\t',
+        dtype=(
+            {**TSV_DTYPES, 'avg_v_identity': np.float64}
+            if narrow_dtypes
+            else {'subject': str}
+        ),
+    )
+    if features:
+        values = os.path.basename(fn).split('.')[1].split('_AND_')
+        for i, feature in enumerate(values):
+            df[features[i]] = feature
+            if narrow_dtypes:
+                df[features[i]] = df[features[i]].astype('category')
+    df['copies_fraction'] = df.copies / df.copies.sum()
+    df['copies_percent'] = 100 * df['copies_fraction']
+    df['shm'] = 100 * (1 - df['avg_v_identity'])
+    if narrow_dtypes:
+        df['avg_v_identity'] = df['avg_v_identity'].astype(
+            TSV_DTYPES['avg_v_identity']
+        )
+    df['clones'] = 1
+    return df.sort_values('copies', ascending=False)
+
+
+def _concat(dfs):
+    '''
+    Concatenates DataFrames while keeping categorical columns categorical by
+    unifying their categories first.
+
+    '''
+    for col in dfs[0].select_dtypes('category').columns:
+        categories = union_categoricals(
+            [df[col] for df in dfs], sort_categories=True
+        ).categories
+        for df in dfs:
+            df[col] = df[col].cat.set_categories(categories)
+    return pd.concat(dfs)
+
+
+def _file_signature(fn):
+    stat = os.stat(fn)
+    return {'mtime': stat.st_mtime_ns, 'size': stat.st_size}
+
+
+def _manifest_path(cache_dir):
+    return os.path.join(cache_dir, 'manifest.json')
+
+
+def _cache_paths(cache_dir, name):
+    return (
+        _manifest_path(cache_dir),
+        os.path.join(cache_dir, f'{name}.parquet'),
+    )
+
+
+def _read_manifest(manifest_fn):
+    try:
+        with open(manifest_fn) as fh:
+            return json.load(fh)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _cache_name(path, name, narrow_dtypes, features=()):
+    '''
+    Returns the cache entry name of ``name`` read from the directory ``path``
+    so entries from different directories, features, or dtype modes sharing a
+    cache directory do not replace each other.
+
+    '''
+    source = json.dumps([os.path.abspath(path), list(features)])
+    digest = hashlib.sha1(source.encode()).hexdigest()[:12]
+    return f'{name}.{"narrow" if narrow_dtypes else "default"}.{digest}'
+
+
+def _load_cache(cache_dir, name, key, manifest=None):
+    manifest_fn, cache_fn = _cache_paths(cache_dir, name)
+    if manifest is None:
+        manifest = _read_manifest(manifest_fn)
+    if manifest.get(name) == key and os.path.exists(cache_fn):
+        return pd.read_parquet(cache_fn)
+    return None
+
+
+def _store_caches(cache_dir, entries):
+    '''
+    Writes each ``(key, df)`` in ``entries``, keyed by name, to the cache and
+    updates the manifest once for all of them.
+
+    '''
+    if not entries:
+        return
+    for name, (_, df) in entries.items():
+        logger.info(f'Caching {name} in {cache_dir}')
+        df.to_parquet(_cache_paths(cache_dir, name)[1])
+    manifest_fn = _manifest_path(cache_dir)
+    manifest = _read_manifest(manifest_fn)
+    manifest.update({name: key for name, (key, _) in entries.items()})
+    with open(manifest_fn, 'w') as fh:
+        json.dump(manifest, fh)
+
+
+def _store_cache(cache_dir, name, key, df):
+    _store_caches(cache_dir, {name: (key, df)})
+
+
+def _cached(cache_dir, name, key, build):
+    '''
+    Returns the DataFrame cached as ``name`` in ``cache_dir`` if it was stored
+    with the same ``key``.  Otherwise ``build`` is called and its result is
+    written to the cache.
+
+    '''
+    df = _load_cache(cache_dir, name, key)
+    if df is None:
+        df = build()
+        _store_cache(cache_dir, name, key, df)
+    return df
+
+
+def read_tsvs(
+    path,
+    features=tuple(),
+    cache_dir=None,
+    processes=1,
+    narrow_dtypes=False,
+):
     '''
     Reads AIRR-formatted input files into a single DataFrame and populates
     common fields.
@@ -28,6 +178,18 @@ def read_tsvs(path, features=tuple()):
         Path to directory containing ``.pooled.tsv`` files
     features : list, optional
         List of features which are encoded in the file names.
+    cache_dir : str, optional
+        If specified, each parsed file is cached in this directory as a
+        Parquet file.  Subsequent calls only re-read files whose modification
+        time or size has changed.
+    processes : int or None, optional
+        The number of worker processes used to read files.  Defaults to 1
+        which reads files serially.  If ``None``, one process per CPU is used.
+    narrow_dtypes : bool, optional
+        If ``True``, files are read with the ``TSV_DTYPES`` schema: gene,
+        subject, functionality, and CDR3 columns are categorical and numeric
+        columns use 16/32-bit types.  Features from ``features`` are also
+        categorical.  This greatly reduces memory usage for large datasets.
 
     Returns
     -------
@@ -38,22 +200,86 @@ def read_tsvs(path, features=tuple()):
         features = [features]
     assert 'subject' not in features
 
-    dfs = []
-    for fn in glob.glob(os.path.join(path, '*.pooled.tsv')):
-        df = pd.read_csv(fn, sep='\t', dtype={'subject': str})
-        if features:
-            values = os.path.basename(fn).split('.')[1].split('_AND_')
-            for i, feature in enumerate(values):
-                df[features[i]] = feature
-        df['copies_fraction'] = df.copies / df.copies.sum()
-        df['copies_percent'] = 100 * df['copies_fraction']
-        df['shm'] = 100 * (1 - df['avg_v_identity'])
-        df['clones'] = 1
-        df = df.sort_values('copies', ascending=False)
-
-        dfs.append(df)
+    files = glob.glob(os.path.join(path, '*.pooled.tsv'))
+    dfs = {}
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        names = {
+            fn: _cache_name(
+                path, os.path.basename(fn), narrow_dtypes, features
+            )
+            for fn in files
+        }
+        keys = {
+            fn: {
+                **_file_signature(fn),
+                'features': list(features),
+                'narrow_dtypes': narrow_dtypes,
+            }
+            for fn in files
+        }
+        manifest = _read_manifest(_manifest_path(cache_dir))
+        for fn in files:
+            dfs[fn] = _load_cache(cache_dir, names[fn], keys[fn], manifest)
+
+    to_read = [fn for fn in files if dfs.get(fn) is None]
+    read = functools.partial(
+        _read_tsv, features=features, narrow_dtypes=narrow_dtypes
+    )
+    if processes == 1:
+        read_dfs = map(read, to_read)
+    else:
+        with mp.Pool(processes=processes or mp.cpu_count()) as pool:
+            read_dfs = pool.map(read, to_read)
+
+    for fn, df in zip(to_read, read_dfs):
+        dfs[fn] = df
+    if cache_dir:
+        _store_caches(
+            cache_dir, {names[fn]: (keys[fn], dfs[fn]) for fn in to_read}
+        )
 
-    return pd.concat(dfs)
+    return _concat([dfs[fn] for fn in files])
+
+
+COMPACT_COLUMNS = (
+    'subject',
+    'replicate_name',
+    'v_gene',
+    'j_gene',
+    'functional',
+    'cdr3_nt',
+    'cdr3_aa',
+)
+
+
+def compact(df):
+    '''
+    Dictionary-encodes the repetitive string columns of a DataFrame, storing
+    each distinct value once.  The clonal feature columns in
+    ``COMPACT_COLUMNS`` and all textual ``METADATA_`` columns are converted to
+    ``category`` dtype, which typically reduces memory usage several-fold.
+
+    The returned DataFrame can be passed to any filtering, pooling, metadata,
+    or plotting function in place of the original.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        The DataFrame to compact.
+
+    Returns
+    -------
+    A copy of ``df`` with string columns encoded as categoricals.
+
+    '''
+    return df.astype(
+        {
+            c: 'category'
+            for c in df.select_dtypes(object).columns
+            if c in COMPACT_COLUMNS or c.startswith('METADATA_')
+        }
+    )
 
 
 def read_metadata(path):
@@ -76,7 +302,7 @@ def read_metadata(path):
     return metadata
 
 
-def read_directory(path):
+def read_directory(path, cache_dir=None, processes=1, narrow_dtypes=False):
     '''
     Reads AIRR-formatted TSV files and joins it with an associated
     `metadata.tsv` file to return a unified `pd.DataFrame`.
@@ -85,18 +311,54 @@ def read_directory(path):
     ----------
     path : str
         Path to AIRR-formatted files and `metadata.tsv`
+    cache_dir : str, optional
+        If specified, the resulting DataFrame is cached in this directory as a
+        Parquet file keyed on the names, modification times, and sizes of the
+        input files.  If none have changed the cached DataFrame is returned
+        directly, otherwise only the changed files are re-read.
+    processes : int or None, optional
+        The number of worker processes used to read files.  See
+        ``read_tsvs``.
+    narrow_dtypes : bool, optional
+        If ``True``, files are read with the ``TSV_DTYPES`` schema and the
+        result is passed through ``compact``.  See ``read_tsvs``.
 
     Returns
     -------
     `pd.DataFrame` with AIRR-seq data and metadata.
 
     '''
-    df = read_tsvs(path, ['replicate_name'])
-    metadata = read_metadata(os.path.join(path, 'metadata.tsv'))
-    df = df.join(metadata, on='replicate_name', rsuffix='__DROP')
-
-    df = df[_cols_without(df, '__DROP')]
-    return df
+    metadata_fn = os.path.join(path, 'metadata.tsv')
+
+    def _read():
+        df = read_tsvs(
+            path,
+            ['replicate_name'],
+            cache_dir=cache_dir,
+            processes=processes,
+            narrow_dtypes=narrow_dtypes,
+        )
+        metadata = read_metadata(metadata_fn)
+        df = df.join(metadata, on='replicate_name', rsuffix='__DROP')
+        df = df[_cols_without(df, '__DROP')]
+        return compact(df) if narrow_dtypes else df
+
+    if not cache_dir:
+        return _read()
+
+    files = sorted(glob.glob(os.path.join(path, '*.pooled.tsv')))
+    return _cached(
+        cache_dir,
+        _cache_name(path, 'read_directory', narrow_dtypes),
+        {
+            'files': {
+                os.path.basename(fn): _file_signature(fn)
+                for fn in [*files, metadata_fn]
+            },
+            'narrow_dtypes': narrow_dtypes,
+        },
+        _read,
+    )
 
 
 def save_fig_and_data(
@@ -233,8 +495,18 @@ USE_COLS = [
 ]
 
 
-def _read_igblast_tsv(fn):
-    df = pd.read_csv(fn, sep='\t', usecols=USE_COLS)
+IGBLAST_CLONE_COLS = [
+    'replicate_name',
+    'v_call',
+    'j_call',
+    'junction_aa',
+    'productive',
+    'junction_length',
+    *DEFAULT_METADATA_REGEX.groupindex.keys(),
+]
+
+
+def _add_igblast_metadata(df, fn):
     metadata = re.search(DEFAULT_METADATA_REGEX, fn)
     df['replicate_name'] = metadata.group(0)
     for k, v in metadata.groupdict().items():
@@ -242,38 +514,142 @@ def _read_igblast_tsv(fn):
     return df
 
 
-def convert_igblast(path):
-    with mp.Pool(processes=mp.cpu_count()) as pool:
-        files = glob.glob(os.path.join(path, '*.tsv'))
-        dfs = pool.map(_read_igblast_tsv, files)
+def _read_igblast_tsv(fn):
+    df = pd.read_csv(fn, sep='\t', usecols=USE_COLS)
+    return _add_igblast_metadata(df, fn)
+
 
-    df = pd.concat(dfs)
+def _strip_alleles(df):
     df['v_call'] = df['v_call'].str.split('*').str[0]
     df['j_call'] = df['j_call'].str.split('*').str[0]
+    return df
+
+
+def _first_rows(groups):
+    '''
+    Returns the position of the first row of each group in ``groups``, in
+    the order of the aggregated groups.  Unlike ``first`` this keeps missing
+    values of the first row.
 
+    '''
+    codes = groups.ngroup().values
+    rows = np.flatnonzero(codes >= 0)
+    _, first = np.unique(codes[rows], return_index=True)
+    return rows[first]
+
+
+def _collapse_reads(df):
+    '''
+    Collapses reads into clones keyed on ``IGBLAST_CLONE_COLS`` using only
+    built-in groupby reductions.  Each clone keeps the junction of its first
+    read.
+
+    '''
     df['copies'] = 1
+    groups = df.groupby(IGBLAST_CLONE_COLS)
+    clones = groups.agg({'v_identity': 'mean', 'copies': 'sum'})
+    clones.insert(0, 'junction', df['junction'].values[_first_rows(groups)])
+    return clones.reset_index()
 
-    df = (
-        df.groupby(
-            [
-                'replicate_name',
-                'v_call',
-                'j_call',
-                'junction_aa',
-                'productive',
-                'junction_length',
-                *DEFAULT_METADATA_REGEX.groupindex.keys(),
-            ]
-        )
-        .agg(
-            {
-                'junction': lambda s: s.iloc[0],
-                'v_identity': np.mean,
-                'copies': np.sum,
-            }
-        )
-        .reset_index()
+
+def _partial_clones(groups, data):
+    '''
+    Aggregates ``groups`` of the rows of ``data`` into partial clones,
+    keeping the first junction and summing ``v_identity``, its non-missing
+    count ``identities``, and ``copies``.
+
+    '''
+    clones = groups.agg(
+        v_identity=('v_identity', 'sum'),
+        identities=('identities', 'sum'),
+        copies=('copies', 'sum'),
     )
+    clones.insert(0, 'junction', data['junction'].values[_first_rows(groups)])
+    return clones
+
+
+def _merge_partial_clones(partials, sort=False):
+    '''
+    Merges partially aggregated clones, indexed by ``IGBLAST_CLONE_COLS``,
+    keeping the first junction in the order of ``partials``.
+
+    '''
+    merged = pd.concat(partials)
+    return _partial_clones(
+        merged.groupby(level=IGBLAST_CLONE_COLS, sort=sort), merged
+    )
+
+
+def _read_igblast_tsv_chunked(fn, chunksize):
+    '''
+    Reads an IgBLAST TSV ``chunksize`` rows at a time, collapsing each chunk
+    into clones so memory usage is bounded by the number of distinct clones
+    rather than the number of reads.
+
+    '''
+    merged, partials, pending = [], [], 0
+    for chunk in pd.read_csv(
+        fn, sep='\t', usecols=USE_COLS, chunksize=chunksize
+    ):
+        chunk = _strip_alleles(_add_igblast_metadata(chunk, fn))
+        chunk['copies'] = 1
+        chunk['identities'] = chunk['v_identity'].notna().astype(np.int64)
+        partials.append(
+            _partial_clones(
+                chunk.groupby(IGBLAST_CLONE_COLS, sort=False), chunk
+            )
+        )
+        pending += len(partials[-1])
+        # Chunks are merged only once they outgrow the merged clones so each
+        # clone is merged a bounded number of times on average
+        if pending >= sum(len(m) for m in merged):
+            merged, partials, pending = (
+                [_merge_partial_clones([*merged, *partials])],
+                [],
+                0,
+            )
+    if not merged and not partials:
+        return None
+    return _merge_partial_clones([*merged, *partials])
+
+
+def convert_igblast(path, chunksize=None):
+    '''
+    Converts a directory of AIRR-formatted IgBLAST TSV files into a clonal
+    DataFrame, collapsing reads with identical genes, CDR3, and functionality
+    within each replicate.  Metadata is parsed from the file names with
+    ``DEFAULT_METADATA_REGEX``.
+
+    Parameters
+    ----------
+    path : str
+        Path to the directory containing the IgBLAST ``.tsv`` files.
+    chunksize : int or None, optional
+        If specified, each file is streamed ``chunksize`` rows at a time and
+        partially aggregated, so peak memory scales with the number of
+        distinct clones rather than the number of reads.
+
+    Returns
+    -------
+    A ``pd.DataFrame`` with one row per clone.
+
+    '''
+    files = glob.glob(os.path.join(path, '*.tsv'))
+    if chunksize:
+        with mp.Pool(processes=mp.cpu_count()) as pool:
+            partials = pool.map(
+                functools.partial(
+                    _read_igblast_tsv_chunked, chunksize=chunksize
+                ),
+                files,
+            )
+        df = _merge_partial_clones(partials, sort=True).reset_index()
+        df['v_identity'] /= df['identities']
+    else:
+        with mp.Pool(processes=mp.cpu_count()) as pool:
+            dfs = pool.map(_read_igblast_tsv, files)
+
+        df = _collapse_reads(_strip_alleles(pd.concat(dfs)))
 
     remaps = {
         'v_call': 'v_gene',
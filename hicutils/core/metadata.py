@@ -1,6 +1,3 @@
-import numpy as np
-
-
 def make_metadata_table(df, pool):
     '''
     Generates a metadata table from a pooled DataFrame.
@@ -9,40 +6,54 @@ def make_metadata_table(df, pool):
     ----------
     df : pd.DataFrame
         The DataFrame to use for the metadata table.
-    pool : str
-        The pooling column to use for each row of the table.
+    pool : str or list(str)
+        The pooling column(s) to use for each row of the table.
 
     Returns
     -------
     A metadata table, indexed by ``pool``.
 
     '''
+    pools = [pool] if isinstance(pool, str) else list(pool)
+    functional = df.functional == 'T'
     pdf = (
-        df.groupby(pool)
-        .agg(
-            {
-                'subject': lambda s: s.nunique(),
-                'replicate_name': lambda s: s.nunique(),
-                'instances': np.sum,
-                'copies': np.sum,
-                'cdr3_num_nts': np.mean,
-                'avg_v_identity': np.mean,
-            }
+        df[
+            list(
+                dict.fromkeys(
+                    [
+                        *pools,
+                        'subject',
+                        'replicate_name',
+                        'instances',
+                        'copies',
+                        'cdr3_num_nts',
+                        'avg_v_identity',
+                        'clone_id',
+                    ]
+                )
+            )
+        ]
+        .assign(
+            in_frame=functional,
+            productive_clones=df.clone_id.where(functional),
         )
-        .rename(
-            {
-                'instances': 'uniques',
-                'subject': 'subjects',
-                'replicate_name': 'replicates',
-            },
-            axis=1,
+        .groupby(pool, observed=True)
+        .agg(
+            subjects=('subject', 'nunique'),
+            replicates=('replicate_name', 'nunique'),
+            uniques=('instances', 'sum'),
+            copies=('copies', 'sum'),
+            cdr3_num_nts=('cdr3_num_nts', 'mean'),
+            avg_v_identity=('avg_v_identity', 'mean'),
+            in_frame=('in_frame', 'mean'),
+            clones=('clone_id', 'nunique'),
+            productive_clones=('productive_clones', 'nunique'),
         )
+        .sort_index()
     )
-    pdf['in_frame'] = df.groupby(pool).apply(
-        lambda d: len(d[d.functional == 'T']) / len(d)
-    )
-    pdf['clones'] = df.groupby(pool).clone_id.nunique()
-    pdf['productive_clones'] = (
-        df[df.functional == 'T'].groupby(pool).clone_id.nunique()
-    )
+    if (pdf.in_frame == 0).any():
+        # Pools without functional clones have no productive clone count
+        pdf['productive_clones'] = pdf.productive_clones.where(
+            pdf.in_frame > 0
+        )
     return pdf
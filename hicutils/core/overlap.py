@@ -0,0 +1,519 @@
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from . import io
+from .log import logger
+
+
+SIMILARITY_SIZES = {
+    'jaccard': 'clones',
+    'overlap': 'clones',
+    'cosine': 'copies',
+    'morisita_horn': 'copies',
+    'bray_curtis': 'copies',
+}
+
+
+def _indicator(matrix, mask=None):
+    '''
+    Returns a binary copy of ``matrix`` which is one where ``mask`` (defaulting
+    to all stored values) is ``True``.
+
+    '''
+    indicator = matrix.copy()
+    indicator.data = np.ones_like(indicator.data) if mask is None else mask
+    indicator.data = indicator.data.astype(np.float64)
+    indicator.eliminate_zeros()
+    return indicator
+
+
+def _factorize(df, features, dropna=True):
+    '''
+    Returns integer codes for each row of ``df`` grouped on ``features`` and
+    the corresponding sorted group labels.  Rows with missing values in
+    ``features`` have a code of -1 unless ``dropna`` is ``False``, in which
+    case missing values form their own groups sorted after all others.
+
+    '''
+    if not dropna:
+        return _factorize_missing(df, features)
+    groups = df.groupby(features, observed=True)
+    codes = groups.ngroup().values
+    codes = np.where(np.isnan(codes), -1, codes).astype(np.int64)
+    labels, order = groups.size().index.sort_values(return_indexer=True)
+    # Observed categorical groups may not be sorted, so remap the codes
+    ranks = np.empty(len(order) + 1, dtype=np.int64)
+    ranks[order] = np.arange(len(order))
+    ranks[-1] = -1
+    return ranks[codes], labels
+
+
+def _factorize_missing(df, features):
+    # Missing values are given their own trailing code in each feature, as
+    # ``groupby`` ignores ``dropna=False`` for categorical columns
+    columns = [features] if isinstance(features, str) else list(features)
+    keys, levels = [], []
+    for column in columns:
+        codes, uniques = pd.factorize(df[column], sort=True)
+        keys.append(np.where(codes < 0, len(uniques), codes))
+        levels.append(np.append(np.asarray(uniques, dtype=object), np.nan))
+    groups, codes = np.unique(
+        np.column_stack(keys), axis=0, return_inverse=True
+    )
+    values = [level[group] for level, group in zip(levels, groups.T)]
+    if isinstance(features, str) or len(columns) == 1:
+        labels = pd.Index(values[0], name=columns[0])
+    else:
+        labels = pd.MultiIndex.from_arrays(values, names=columns)
+    return codes.astype(np.int64), labels
+
+
+class OverlapMatrix:
+    '''
+    A sparse clone-by-pool matrix of a size metric (by default ``copies``).
+    Each row is a clone, as defined by ``clone_features``, and each column is
+    a pool.  The matrix is stored in CSR format so only the clone/pool pairs
+    which occur take memory, making it suitable for millions of clones across
+    hundreds of pools.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        The DataFrame from which to build the matrix.
+    pool : str or list(str)
+        The column(s) defining each pool.
+    clone_features : str or list(str)
+        The feature(s) defining a clone.  Defaults to ``clone_id``.
+    values : str
+        The column summed into each cell.  Defaults to ``copies``.
+    dropna : bool
+        If ``True`` (the default) rows with missing values in
+        ``clone_features`` are excluded.  Otherwise missing values are kept as
+        clones of their own.
+
+    Attributes
+    ----------
+    matrix : scipy.sparse.csr_matrix
+        The clone-by-pool matrix.
+    clones : pd.Index
+        The clone labels of each row.
+    pools : pd.Index
+        The pool labels of each column.
+
+    '''
+
+    def __init__(
+        self,
+        df,
+        pool,
+        clone_features='clone_id',
+        values='copies',
+        dropna=True,
+    ):
+        clone_codes, self.clones = _factorize(df, clone_features, dropna)
+        pool_codes, self.pools = _factorize(df, pool)
+        keep = (clone_codes >= 0) & (pool_codes >= 0)
+        self.matrix = sparse.csr_matrix(
+            (
+                df[values].values[keep].astype(np.float64),
+                (clone_codes[keep], pool_codes[keep]),
+            ),
+            shape=(len(self.clones), len(self.pools)),
+        )
+        self.matrix.eliminate_zeros()
+
+    @classmethod
+    def _from_parts(cls, matrix, clones, pools):
+        overlap = cls.__new__(cls)
+        overlap.matrix, overlap.clones, overlap.pools = matrix, clones, pools
+        return overlap
+
+    def __len__(self):
+        return len(self.clones)
+
+    def presence(self):
+        '''
+        Returns a boolean sparse matrix indicating which clones occur in which
+        pools.
+
+        '''
+        return self.matrix.astype(bool)
+
+    def pool_counts(self):
+        '''
+        Returns a ``pd.Series`` with the number of pools in which each clone
+        occurs.
+
+        '''
+        return pd.Series(
+            np.diff(self.matrix.indptr), index=self.clones, name='pools'
+        )
+
+    def clone_counts(self):
+        '''
+        Returns a ``pd.Series`` with the number of clones in each pool.
+
+        '''
+        return pd.Series(
+            np.bincount(self.matrix.indices, minlength=len(self.pools)),
+            index=self.pools,
+            name='clones',
+        )
+
+    def totals(self):
+        '''
+        Returns a ``pd.Series`` with the sum of the matrix values in each pool.
+
+        '''
+        return pd.Series(
+            np.asarray(self.matrix.sum(axis=0)).ravel(), index=self.pools
+        )
+
+    def normalize(self):
+        '''
+        Returns a new ``OverlapMatrix`` where each pool sums to one.
+
+        '''
+        totals = self.totals().values
+        scale = np.divide(
+            1, totals, out=np.zeros_like(totals), where=totals != 0
+        )
+        return self._from_parts(
+            self.matrix @ sparse.diags(scale), self.clones, self.pools
+        )
+
+    def select(self, clones=None, pools=None):
+        '''
+        Returns a new ``OverlapMatrix`` limited to a subset of clones and/or
+        pools.
+
+        Parameters
+        ----------
+        clones : array-like of bool or None
+            A boolean mask over the clones to keep.
+        pools : list or None
+            The pool labels to keep, in the order given.
+
+        '''
+        matrix, clone_index, pool_index = self.matrix, self.clones, self.pools
+        if clones is not None:
+            clones = np.asarray(clones, dtype=bool)
+            matrix, clone_index = matrix[clones], clone_index[clones]
+        if pools is not None:
+            columns = self.pools.get_indexer(pools)
+            if (columns < 0).any():
+                raise KeyError(f'Pools not in overlap matrix: {pools}')
+            matrix, pool_index = matrix[:, columns], self.pools[columns]
+        return self._from_parts(matrix.tocsr(), clone_index, pool_index)
+
+    def clones_in(self, pool_value):
+        '''
+        Returns the labels of clones which occur in the pool ``pool_value``.
+
+        '''
+        column = self.matrix[:, self.pools.get_loc(pool_value)]
+        return self.clones[np.unique(column.nonzero()[0])]
+
+    def memberships(self):
+        '''
+        Returns the pools in which each clone occurs packed into bitmasks: a
+        ``(clones, words)`` array of ``np.uint64`` where bit ``j % 64`` of
+        word ``j // 64`` is set if the clone occurs in pool ``j``.
+
+        '''
+        indices = self.matrix.indices
+        bits = np.left_shift(np.uint64(1), (indices % 64).astype(np.uint64))
+        nonempty = np.diff(self.matrix.indptr) > 0
+        words = np.zeros(
+            (len(self.clones), (len(self.pools) + 63) // 64), dtype=np.uint64
+        )
+        for word in range(words.shape[1]):
+            # Each pool sets a distinct bit so summing is the same as or-ing
+            values = np.where(indices // 64 == word, bits, np.uint64(0))
+            values = np.append(values, np.uint64(0))
+            words[nonempty, word] = np.add.reduceat(
+                values, self.matrix.indptr[:-1]
+            )[nonempty]
+        return words
+
+    def to_frame(self, presence=False):
+        '''
+        Returns the matrix as a dense ``pd.DataFrame`` indexed by clone with
+        one column per pool.  Absent clone/pool pairs are zero.  If
+        ``presence`` is ``True``, a boolean presence frame is returned
+        instead.
+
+        '''
+        matrix = self.presence() if presence else self.matrix
+        return pd.DataFrame(
+            matrix.toarray(), index=self.clones, columns=self.pools
+        )
+
+    def similarity(self, metric, pools=None):
+        '''
+        Computes the similarity between pools in batched sparse operations.
+
+        Parameters
+        ----------
+        metric : str
+            One of ``jaccard`` (clones whose values are equal in both pools
+            over clones in either pool, matching ``scipy``), ``overlap``
+            (shared clones over the size of the smaller pool), ``cosine``,
+            ``morisita_horn``, or ``bray_curtis``.
+        pools : list or None
+            If specified, only the similarity of these pools to all pools is
+            computed.
+
+        Returns
+        -------
+        A ``pd.DataFrame`` indexed by ``pools`` (or all pools) with one column
+        per pool.
+
+        '''
+        assert metric in SIMILARITY_SIZES
+        rows = (
+            np.arange(len(self.pools))
+            if pools is None
+            else self.pools.get_indexer(pools)
+        )
+        matrix = self.matrix.tocsc()
+        sub = matrix[:, rows]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if metric in ('jaccard', 'overlap'):
+                present = _indicator(matrix)
+                shared = (_indicator(sub).T @ present).toarray()
+                sizes = np.asarray(present.sum(axis=0)).ravel()
+                if metric == 'overlap':
+                    sim = shared / np.minimum.outer(sizes[rows], sizes)
+                else:
+                    equal = sum(
+                        (
+                            _indicator(sub, sub.data == v).T
+                            @ _indicator(matrix, matrix.data == v)
+                        ).toarray()
+                        for v in np.unique(sub.data)
+                    )
+                    union = sizes[rows][:, None] + sizes - shared
+                    sim = np.where(union > 0, equal / union, 1.0)
+            elif metric == 'bray_curtis':
+                totals = np.asarray(matrix.sum(axis=0)).ravel()
+                sim = (
+                    2
+                    * np.vstack([self._min_sums(r) for r in rows])
+                    / np.add.outer(totals[rows], totals)
+                )
+            else:
+                dots = (sub.T @ matrix).toarray()
+                squares = np.asarray(matrix.multiply(matrix).sum(axis=0))
+                squares = squares.ravel()
+                if metric == 'cosine':
+                    norms = np.sqrt(squares)
+                    sim = dots / np.outer(norms[rows], norms)
+                else:
+                    totals = np.asarray(matrix.sum(axis=0)).ravel()
+                    dominance = squares / totals**2
+                    sim = (
+                        2
+                        * dots
+                        / (
+                            np.add.outer(dominance[rows], dominance)
+                            * np.outer(totals[rows], totals)
+                        )
+                    )
+
+        return pd.DataFrame(sim, index=self.pools[rows], columns=self.pools)
+
+    def _min_sums(self, column):
+        '''
+        Returns the sum of the element-wise minimum between pool ``column`` and
+        every pool.
+
+        '''
+        values = self.matrix[:, column].tocsc()
+        clones = values.indices
+        rows = self.matrix[clones]
+        minimums = np.minimum(
+            rows.data, np.repeat(values.data, np.diff(rows.indptr))
+        )
+        return np.bincount(
+            rows.indices, weights=minimums, minlength=len(self.pools)
+        )
+
+
+def _pool_digests(overlap):
+    '''
+    Returns a digest of the clones and values of each pool in ``overlap``,
+    which changes whenever the contents of the pool change.
+
+    '''
+    columns = overlap.matrix.tocsc()
+    columns.sort_indices()
+    clones = pd.util.hash_pandas_object(overlap.clones).values
+    digests = []
+    for start, end in zip(columns.indptr[:-1], columns.indptr[1:]):
+        rows = slice(start, end)
+        digest = hashlib.sha1(clones[columns.indices[rows]].tobytes())
+        digest.update(columns.data[rows].tobytes())
+        digests.append(digest.hexdigest())
+    return digests
+
+
+def stored_similarity(overlap, metric, cache_dir, name):
+    '''
+    Returns ``overlap.similarity(metric)`` using a persistent store of
+    previously computed pairs in ``cache_dir``.  Each pool is keyed by its
+    label and a digest of its clones and values so only pairs involving new
+    or changed pools are computed; the rest are read from disk.  The store is
+    then rewritten with the current pools.
+
+    Parameters
+    ----------
+    overlap : OverlapMatrix
+        The matrix from which to compute similarity.
+    metric : str
+        The similarity metric passed to ``OverlapMatrix.similarity``.
+    cache_dir : str
+        The directory holding the store.
+    name : str
+        The name of the store, which should identify the metric, pool, and
+        clone features.
+
+    Returns
+    -------
+    A ``pd.DataFrame`` indexed and columned by pool.
+
+    '''
+    os.makedirs(cache_dir, exist_ok=True)
+    labels = [str(p) for p in overlap.pools]
+    if len(set(labels)) != len(labels):
+        raise ValueError('Pool labels must be unique when stored as strings.')
+    key = dict(zip(labels, _pool_digests(overlap)))
+
+    manifest_fn, cache_fn = io._cache_paths(cache_dir, name)
+    stored = io._read_manifest(manifest_fn).get(name, {})
+    sim = pd.DataFrame(np.nan, index=labels, columns=labels)
+    if stored and os.path.exists(cache_fn):
+        cached = pd.read_parquet(cache_fn)
+        known = [
+            label
+            for label in labels
+            if stored.get(label) == key[label] and label in cached.index
+        ]
+        sim.loc[known, known] = cached.loc[known, known]
+    else:
+        known = []
+
+    new = [i for i, label in enumerate(labels) if label not in set(known)]
+    if new:
+        logger.info(
+            f'Computing {metric} similarity for {len(new)} new pools of '
+            f'{len(labels)}'
+        )
+        part = overlap.similarity(metric, pools=overlap.pools[new]).values
+        sim.iloc[new, :] = part
+        sim.iloc[:, new] = part.T
+        io._store_cache(cache_dir, name, key, sim)
+
+    sim.index = sim.columns = overlap.pools
+    return sim
+
+
+class Intersections:
+    '''
+    The exclusive intersections of an ``OverlapMatrix``: each clone belongs to
+    the one intersection matching the exact set of pools in which it occurs.
+    Clones are grouped by sorting their packed pool bitmasks with
+    ``np.unique`` so the cost scales with the number of clones rather than the
+    number of possible pool combinations.
+
+    Parameters
+    ----------
+    overlap : OverlapMatrix
+        The matrix from which to find intersections.
+
+    Attributes
+    ----------
+    codes : np.ndarray
+        The intersection of each clone in ``overlap.clones``.
+    index : pd.MultiIndex
+        One boolean level per pool indicating membership of each
+        intersection.
+    sizes : np.ndarray
+        The number of clones in each intersection.
+
+    '''
+
+    def __init__(self, overlap):
+        keys, codes, self.sizes = np.unique(
+            overlap.memberships(),
+            axis=0,
+            return_inverse=True,
+            return_counts=True,
+        )
+        self.codes = codes.ravel()
+        columns = np.arange(len(overlap.pools))
+        present = (
+            keys[:, columns // 64] >> (columns % 64).astype(np.uint64)
+        ) & np.uint64(1)
+        self.index = pd.MultiIndex.from_arrays(
+            list(present.astype(bool).T), names=list(overlap.pools)
+        )
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def aggregate(self, values, how='sum'):
+        '''
+        Aggregates per-clone ``values`` within each intersection.
+
+        Parameters
+        ----------
+        values : pd.DataFrame
+            Values aligned with the clones of the ``OverlapMatrix``.
+        how : str or dict
+            Either ``sum`` or ``mean`` or a mapping of column to either.
+            Missing values are ignored.
+
+        Returns
+        -------
+        A ``pd.DataFrame`` indexed by intersection with a ``clones`` column
+        followed by the aggregated columns.
+
+        '''
+        if isinstance(how, str):
+            how = {column: how for column in values.columns}
+        table = {'clones': self.sizes}
+        for column, func in how.items():
+            assert func in ('sum', 'mean')
+            column_values = values[column].values.astype(np.float64)
+            valid = ~np.isnan(column_values)
+            totals = np.bincount(
+                self.codes[valid],
+                weights=column_values[valid],
+                minlength=len(self),
+            )
+            if func == 'mean':
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    totals /= np.bincount(
+                        self.codes[valid], minlength=len(self)
+                    )
+            table[column] = totals
+        return pd.DataFrame(table, index=self.index)
+
+    def top(self, n, weights=None):
+        '''
+        Returns the positions of the ``n`` largest intersections by clone count
+        or, if specified, the sum of per-clone ``weights``.
+
+        '''
+        totals = (
+            self.sizes
+            if weights is None
+            else np.bincount(self.codes, weights=weights, minlength=len(self))
+        )
+        return np.argsort(-totals, kind='stable')[:n]
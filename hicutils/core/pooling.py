@@ -1,41 +1,38 @@
 import numpy as np
+import pandas as pd
 
-from .io import _cols_without
-
-
-def _aggregate_pool(pool_df, pool_by):
-    def _norm(df):
-        df['avg_v_identity'] /= df['copies'].sum()
-        return df
-
-    name = pool_df.name
-    pool_df = pool_df.sort_values('copies', ascending=False)
-    pool_df['avg_v_identity'] = pool_df['avg_v_identity'] * pool_df['copies']
-    funcs = {c: 'first' for c in pool_df.columns if 'METADATA_' not in c}
-    funcs.update(
-        {
-            'instances': np.sum,
-            'copies': np.sum,
-            'top_copy_seq': lambda s: s.iloc[0],
-            'avg_v_identity': np.sum,
-        }
-    )
-    pool_df = pool_df.groupby('clone_id', as_index=False).agg(funcs)
-    total_copies_by_clone = pool_df.groupby('clone_id').copies.sum()
-    pool_df['total_copies'] = pool_df['clone_id'].apply(
-        lambda c: total_copies_by_clone.loc[c]
-    )
-    pool_df['avg_v_identity'] /= pool_df['total_copies']
-    pool_df = pool_df.drop('total_copies', axis=1)
-
-    pool_df['shm'] = (100 * (1 - pool_df['avg_v_identity'])).round(4)
-    pool_df['copies_fraction'] = pool_df['copies'] / pool_df['copies'].sum()
-    pool_df['copies_percent'] = 100 * pool_df['copies_fraction']
-    pool_df[[p.replace('METADATA_', '') for p in pool_by]] = name
-    return pool_df.reset_index(drop=True)
+
+def _key_codes(values):
+    '''
+    Returns sorted integer codes of ``values`` where missing values have
+    their own code after all others.
+
+    '''
+    codes, uniques = pd.factorize(values, sort=True)
+    return np.where(codes < 0, len(uniques), codes)
 
 
 def pool_by(df, pool_by):
+    '''
+    Pools clones by one or more features, aggregating all rows of each clone
+    within a pool into a single row.  Copies and instances are summed,
+    ``avg_v_identity`` (and therefore ``shm``) is the copy-weighted mean, and
+    all other fields are taken from the row of the clone with the most copies.
+    Each pool is aggregated in a single vectorized pass.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        The DataFrame to pool.
+    pool_by : str or list(str)
+        The feature(s) on which to pool.  Metadata features may be specified
+        with or without the ``METADATA_`` prefix.
+
+    Returns
+    -------
+    A DataFrame with one row per clone in each pool.
+
+    '''
     if isinstance(pool_by, str):
         pool_by = [pool_by]
 
@@ -43,9 +40,38 @@ def pool_by(df, pool_by):
         f'METADATA_{p}' if p not in ('subject', 'replicate_name') else p
         for p in pool_by
     ]
-    df = df.groupby(pool_by, dropna=False).apply(_aggregate_pool, pool_by)
-    return (
-        df[_cols_without(df, 'METADATA_')]
-        .reset_index(drop=True)
-        .drop('replicate_name', axis=1)
-    )
+    keys = [*pool_by, 'clone_id']
+
+    # Stable sort so ties in copies keep their input order
+    df = df.sort_values('copies', ascending=False, kind='stable')
+    df = df.assign(avg_v_identity=df['avg_v_identity'] * df['copies'])
+    # Keys are grouped by their codes, as missing categorical values cannot
+    # be kept as groups, so every group is sorted and ``first`` and
+    # ``ngroup`` agree on the groups
+    codes = [_key_codes(df[key]) for key in keys]
+    groups = df.groupby(codes)
+
+    columns = [c for c in df.columns if 'METADATA_' not in c]
+    pooled = groups[[c for c in columns if c not in keys]].first()
+    pooled[['instances', 'copies', 'avg_v_identity']] = groups[
+        ['instances', 'copies', 'avg_v_identity']
+    ].sum()
+    pooled['avg_v_identity'] /= pooled['copies']
+    _, top_rows = np.unique(groups.ngroup().values, return_index=True)
+    pooled = pooled.reset_index(drop=True)
+    for key in [*keys, 'top_copy_seq']:
+        pooled[key] = df[key].values[top_rows]
+
+    pooled['shm'] = (100 * (1 - pooled['avg_v_identity'])).round(4)
+    pooled['copies_fraction'] = pooled['copies'] / pooled.groupby(
+        [c[top_rows] for c in codes[:-1]]
+    )['copies'].transform('sum')
+    pooled['copies_percent'] = 100 * pooled['copies_fraction']
+    for p in pool_by:
+        pooled[p.replace('METADATA_', '')] = pooled[p]
+
+    columns = [
+        *columns,
+        *[p.replace('METADATA_', '') for p in pool_by if p not in columns],
+    ]
+    return pooled[columns].drop('replicate_name', axis=1)
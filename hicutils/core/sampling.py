@@ -0,0 +1,176 @@
+import functools
+import multiprocessing as mp
+
+import numpy as np
+import pandas as pd
+from scipy.special import gammaln
+
+from .log import logger
+from .overlap import _factorize
+
+
+def _pool_rows(codes, n_pools):
+    # Returns the row indices of each pool
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(n_pools + 1))
+    return [order[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def subsample(df, pool, depth, seed=None):
+    '''
+    Subsamples the copies of each pool without replacement to a total of
+    ``depth`` copies.  Each pool's ``copies`` are drawn from a multivariate
+    hypergeometric distribution so reads are never expanded.  Pools with fewer
+    than ``depth`` copies are excluded.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        The DataFrame to subsample.
+    pool : str or list(str)
+        The column(s) defining each pool.
+    depth : int
+        The number of copies to draw from each pool.
+    seed : int, np.random.SeedSequence, np.random.Generator, or None
+        The seed of the random number generator.
+
+    Returns
+    -------
+    A copy of ``df`` with subsampled ``copies``.  Clones with no copies drawn
+    are removed and ``copies_fraction``/``copies_percent`` are recomputed
+    within each pool.
+
+    '''
+    rng = np.random.default_rng(seed)
+    codes, pools = _factorize(df, pool)
+    copies = df.copies.values.astype(np.int64)
+    totals = np.bincount(
+        codes[codes >= 0], weights=copies[codes >= 0], minlength=len(pools)
+    )
+    shallow = totals < depth
+    if shallow.any():
+        logger.warning(
+            f'Excluding {shallow.sum()} pools with fewer than {depth} '
+            f'copies: {list(pools[shallow])}'
+        )
+
+    sampled = np.zeros_like(copies)
+    for rows, skip in zip(_pool_rows(codes, len(pools)), shallow):
+        if not skip:
+            sampled[rows] = rng.multivariate_hypergeometric(
+                copies[rows], depth
+            )
+
+    keep = (codes >= 0) & (sampled > 0)
+    df = df[keep].copy()
+    df['copies'] = sampled[keep]
+    if 'copies_fraction' in df.columns:
+        df['copies_fraction'] = df.copies / depth
+    if 'copies_percent' in df.columns:
+        df['copies_percent'] = 100 * df.copies / depth
+    return df
+
+
+def _bootstrap_iteration(df, pool, depth, func, seed):
+    return func(subsample(df, pool, depth, seed=seed))
+
+
+def bootstrap(df, pool, depth, func, iterations=100, seed=None, processes=1):
+    '''
+    Repeatedly subsamples ``df`` to ``depth`` copies per pool and applies
+    ``func`` to each subsample.  Each iteration has an independent random
+    stream spawned from ``seed`` so results are reproducible regardless of
+    ``processes``.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        The DataFrame to subsample.
+    pool : str or list(str)
+        The column(s) defining each pool.
+    depth : int
+        The number of copies to draw from each pool.
+    func : func(df) -> pd.DataFrame or pd.Series
+        The function applied to each subsample.  If ``processes`` is not 1 it
+        must be picklable, e.g. a module-level function or
+        ``functools.partial``.
+    iterations : int
+        The number of subsamples.
+    seed : int or None
+        The seed from which each iteration's seed is spawned.
+    processes : int or None, optional
+        The number of worker processes.  Defaults to 1 which runs iterations
+        serially.  If ``None``, one process per CPU is used.
+
+    Returns
+    -------
+    The results of ``func`` concatenated with an outer ``iteration`` index
+    level.
+
+    '''
+    seeds = np.random.SeedSequence(seed).spawn(iterations)
+    run = functools.partial(_bootstrap_iteration, df, pool, depth, func)
+    if processes == 1:
+        results = list(map(run, seeds))
+    else:
+        with mp.Pool(processes=processes or mp.cpu_count()) as workers:
+            results = workers.map(run, seeds)
+    return pd.concat(dict(enumerate(results)), names=['iteration'])
+
+
+def rarefaction(df, pool, depths=None, steps=20):
+    '''
+    Computes rarefaction curves for all pools at once: the expected number of
+    clones observed when drawing each of ``depths`` copies without
+    replacement.  Expectations are computed exactly from the hypergeometric
+    probability that each clone is absent, so no sampling is performed.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        The DataFrame from which to compute the curves.
+    pool : str or list(str)
+        The column(s) defining each pool.
+    depths : list(int) or None
+        The depths at which to evaluate the curves.  If ``None``, ``steps``
+        evenly spaced depths up to the largest pool are used.
+    steps : int
+        The number of depths if ``depths`` is ``None``.
+
+    Returns
+    -------
+    A ``pd.DataFrame`` indexed by depth with one column per pool.  Depths
+    greater than a pool's total copies are ``NaN``.
+
+    '''
+    codes, pools = _factorize(df, pool)
+    copies = df.copies.values.astype(np.int64)
+    keep = (codes >= 0) & (copies > 0)
+    codes, copies = codes[keep], copies[keep]
+    totals = np.bincount(codes, weights=copies, minlength=len(pools))
+    totals = totals.astype(np.int64)
+    if depths is None:
+        depths = np.unique(
+            np.linspace(1, totals.max(initial=1), steps).astype(np.int64)
+        )
+
+    remaining = totals[codes] - copies
+    curves = np.full((len(depths), len(pools)), np.nan)
+    for i, depth in enumerate(depths):
+        # P(clone absent) = C(N - x, n) / C(N, n)
+        can_be_absent = remaining >= depth
+        log_absent = (
+            gammaln(remaining + 1)
+            - gammaln(np.maximum(remaining - depth, 0) + 1)
+            - gammaln(totals[codes] + 1)
+            + gammaln(np.maximum(totals[codes] - depth, 0) + 1)
+        )
+        present = np.where(can_be_absent, -np.expm1(log_absent), 1)
+        curves[i] = np.where(
+            depth <= totals,
+            np.bincount(codes, weights=present, minlength=len(pools)),
+            np.nan,
+        )
+    return pd.DataFrame(
+        curves, index=pd.Index(depths, name='depth'), columns=pools
+    )
@@ -1,21 +1,43 @@
-from collections import Counter
+import numpy as np
 import seaborn as sns
 import pandas as pd
 import matplotlib.pyplot as plt
 
 import logomaker
 
+from ..core.cdr3 import PositionMatrices, Spectratypes
 from .heatmap import basic_clustermap
 
 
-def _get_counts(pdf, size_metric):
-    # TODO: Fix this to count clones only once if size_metric = clones
+def _get_counts(df, pool, size_metric):
+    '''
+    Returns the amino-acid composition of CDR3s in each pool of ``df`` weighted
+    by ``size_metric``.  The CDR3s are joined into a single byte array and each
+    character is counted with one ``np.bincount`` keyed on pool and byte.
+
+    '''
+    if size_metric == 'clones':
+        # Count each clone once per pool
+        df = df.drop_duplicates([pool, 'clone_id'])
+    sizes = df.groupby([pool, 'cdr3_aa'], observed=True)[size_metric].sum()
+    pool_codes, pools = pd.factorize(
+        sizes.index.get_level_values(0), sort=True
+    )
+    cdr3s = sizes.index.get_level_values(1).astype(str)
+    lengths = cdr3s.str.len().values
+
+    chars = np.frombuffer(''.join(cdr3s).encode('ascii'), dtype=np.uint8)
+    counts = np.bincount(
+        np.repeat(pool_codes * 256, lengths) + chars,
+        weights=np.repeat(sizes.values.astype(np.float64), lengths),
+        minlength=len(pools) * 256,
+    ).reshape(len(pools), 256)
+    used = np.flatnonzero(np.bincount(chars, minlength=256))
     return pd.DataFrame(
-        pdf.cdr3_aa.apply(lambda r: pd.Series(Counter(r)))
-        .fillna(0)
-        .mul(pdf[size_metric], axis=0)
-        .sum()
-    ).T
+        counts[:, used],
+        index=pd.Index(np.asarray(pools)),
+        columns=[chr(c) for c in used],
+    )
 
 
 def plot_cdr3_aa_usage(
@@ -25,6 +47,7 @@ def plot_cdr3_aa_usage(
     normalize_by='rows',
     cluster_by='both',
     figsize=(20, 10),
+    order=None,
 ):
     '''
     Plots CDR3 amino-acid usage separated by pool.
@@ -38,7 +61,8 @@ def plot_cdr3_aa_usage(
         The pooling column to use for each row of the heatmap.
     size_metric : str
         The size metric which is plotted as the intensity of each cell.  Must
-        be one of ``clones``, ``copies``, or ``uniques``.
+        be one of ``clones``, ``copies``, or ``uniques``.  With ``clones``,
+        a clone occurring in several rows of a pool is counted once.
     normalize_by : str
         Sets how to normalize the plot.  If set to ``rows`` (the default) each
         row is normalized to sum to one.  Setting it to ``cols`` causes each
@@ -46,6 +70,10 @@ def plot_cdr3_aa_usage(
     cluster_by : str (``rows``, ``cols``, or ``both``) or None
         Sets which clustering to display.  Valid values are ``rows``, ``cols``,
         ``both``, or clustering can be disabled with ``None``.
+    order : ClusterOrder or None
+        A precomputed clustering of the rows and columns, e.g. from
+        ``ClusterOrder(pdf)`` on a previously returned ``pdf``, to reuse
+        instead of clustering the plotted matrix.
 
     Returns
     -------
@@ -55,18 +83,25 @@ def plot_cdr3_aa_usage(
     '''
 
     assert size_metric in ('clones', 'copies', 'uniques')
-    df = df.copy()
-
-    pdf = pd.concat(
-        {k: _get_counts(d, size_metric) for k, d in df.groupby(pool)}, sort=True
-    ).fillna(0)
-    pdf.index = pdf.index.droplevel(1)
+    pdf = _get_counts(df, pool, size_metric)
 
-    g = basic_clustermap(pdf, normalize_by, cluster_by, figsize=figsize)
+    g = basic_clustermap(
+        pdf, normalize_by, cluster_by, order=order, figsize=figsize
+    )
     return g, pdf
 
 
-def plot_cdr3_logo(df, by, length, hide_ambig=True, **kwargs):
+def plot_cdr3_logo(
+    df,
+    by,
+    length,
+    hide_ambig=True,
+    pool=None,
+    pool_value=None,
+    size_metric='clones',
+    matrices=None,
+    **kwargs,
+):
     '''
     Creates a logo plot for CDR3 strings of a given length either by amino-acid
     or nucleotide.
@@ -80,6 +115,18 @@ def plot_cdr3_logo(df, by, length, hide_ambig=True, **kwargs):
         nucleotides.
     length : int
         The length of CDR3s to plot.  Interpreted as the length of ``by``.
+    pool : str or list(str), optional
+        If specified, only CDR3s in the pool ``pool_value`` are plotted.
+    pool_value : optional
+        The value of ``pool`` to plot.
+    size_metric : str
+        How each CDR3 is weighted.  Must be one of ``clones`` (the default),
+        ``copies``, or ``uniques``.
+    matrices : PositionMatrices, optional
+        Precomputed matrices from ``hicutils.core.cdr3.PositionMatrices``
+        built with the same ``by``, ``pool``, and ``size_metric``.  Passing
+        these allows logos for many lengths and pools to be plotted without
+        recounting ``df``.
 
     Returns
     -------
@@ -89,10 +136,9 @@ def plot_cdr3_logo(df, by, length, hide_ambig=True, **kwargs):
     '''
 
     assert by in ('cdr3_aa', 'cdr3_nt')
-    cdrs = df[df[by].str.len() == length][by]
-    m = logomaker.alignment_to_matrix(cdrs).pipe(
-        logomaker.transform_matrix, normalize_values=True
-    )
+    if matrices is None:
+        matrices = PositionMatrices(df, by, pool, size_metric)
+    m = matrices.frequency_matrix(length, pool_value)
     if hide_ambig:
         if by == 'cdr3_nt' and 'N' in m.columns:
             m = m.drop('N', axis=1)
@@ -125,8 +171,13 @@ def plot_cdr3_spectratype(df, color_top=10, **kwargs):
 
     '''
 
-    all_df = df.groupby('cdr3_num_nts').copies_percent.sum().reset_index()
-    top_df = df.sort_values('copies_percent', ascending=False)[:color_top]
+    spectratypes = Spectratypes(df)
+    all_df = spectratypes.histogram('copies_percent')
+    top_df = (
+        spectratypes.top(color_top, 'copies_percent')[
+            ['cdr3_num_nts', 'copies_percent', 'cdr3_aa']
+        ]
+    ).astype({'cdr3_aa': str})
     cdf = (
         pd.concat([top_df, all_df], sort=False)
         .fillna('')
@@ -182,26 +233,14 @@ def plot_cdr3_distribution(df, pool, size_metric='clones', **kwargs):
     '''
 
     assert size_metric in ('clones', 'copies', 'uniques')
-
-    def _norm(df):
-        df[size_metric] /= df[size_metric].sum()
-        return df
-
-    pdf = (
-        df.groupby([pool, 'cdr3_num_nts'])[size_metric]
-        .sum()
-        .to_frame()
-        .reset_index()
-        .groupby(pool)
-        .apply(_norm)
-    )
+    pdf = Spectratypes(df, pool).histogram(size_metric, normalize=True)
     g = sns.catplot(
         data=pdf,
         x='cdr3_num_nts',
         y=size_metric,
         hue=pool,
         kind=kwargs.pop('kind', 'bar'),
-        **kwargs
+        **kwargs,
     )
     g.set(xlabel='CDR3 length (NT)', ylabel='Clone Fraction')
     return g, pdf
@@ -1,11 +1,10 @@
-from collections import Counter
-import re
-
 import seaborn as sns
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 
+from ..core.diversity import RankedSizes, size_histogram
+
 
 def plot_clone_counts(df, pool, **kwargs):
     '''
@@ -25,8 +24,9 @@ def plot_clone_counts(df, pool, **kwargs):
 
     '''
     clone_count_per_pool = (
-        df.groupby(pool)
+        df.groupby(pool, observed=True)
         .clone_id.nunique()
+        .sort_index()
         .to_frame()
         .reset_index()
         .rename({'clone_id': 'clones'}, axis=1)
@@ -42,7 +42,7 @@ def plot_clone_counts(df, pool, **kwargs):
     return g, clone_count_per_pool
 
 
-def plot_clone_sizes(df, cutoff=None, **kwargs):
+def plot_clone_sizes(df, cutoff=None, log_bins=None, **kwargs):
     '''
     Plots the distribution of clone sizes in ``df``.
 
@@ -53,7 +53,11 @@ def plot_clone_sizes(df, cutoff=None, **kwargs):
     cutoff : int or None
         Aggregate all clones with ``cutoff`` or more copies into one bin on the
         right side of the graph.  This is useful to condense the tail of the
-        plotted distribution.
+        plotted distribution.  Sizes below ``cutoff`` with no clones are shown
+        as empty bins.
+    log_bins : int or None
+        If specified, clone sizes are grouped into this many logarithmically
+        spaced bins instead.  Cannot be combined with ``cutoff``.
 
     Returns
     -------
@@ -61,25 +65,28 @@ def plot_clone_sizes(df, cutoff=None, **kwargs):
     underlying DataFrame.
 
     '''
-    df = (
-        df.groupby('copies')
-        .clone_id.nunique()
-        .to_frame()
-        .rename(
-            {
-                'clone_id': 'clones',
-            },
-            axis=1,
-        )
-    )
-    df['clones'] = 100 * df['clones'] / df['clones'].sum()
-    df = df.reindex(range(df.index.min(), df.index.max())).reset_index()
-    if cutoff:
-        clones = df[df['copies'] >= cutoff].clones.sum()
-        df = df[df['copies'] < cutoff]
-        df = pd.concat(
-            [df, pd.DataFrame([{'copies': f'{cutoff}+', 'clones': clones}])]
+    assert not (cutoff and log_bins), 'Specify only one of cutoff or log_bins'
+    clones = size_histogram(df, bins=log_bins)
+    clones = 100 * clones / clones.sum()
+    if log_bins:
+        clones.index = [
+            str(b.left) if b.length == 1 else _label(b.left - 1, b.right - 1)
+            for b in clones.index
+        ]
+    elif cutoff:
+        tail = clones[clones.index >= cutoff].sum()
+        clones = pd.concat(
+            [
+                clones.reindex(
+                    range(
+                        clones.index.min(),
+                        min(cutoff, clones.index.max() + 1),
+                    )
+                ),
+                pd.Series({f'{cutoff}+': tail}),
+            ]
         )
+    df = clones.rename_axis('copies').rename('clones').reset_index()
 
     g = sns.catplot(
         data=df,
@@ -172,73 +179,39 @@ def plot_top_clones(
     return g, cdf
 
 
-def _range_for_pool(df, portions, total_clones, intervals):
-    pool = df.name
-    total_clones[pool] += len(df)
-
-    for start, end in zip(intervals[:-1], intervals[1:]):
-        portions.append(
-            {
-                'pool': pool,
-                'start': start,
-                'end': end,
-                'copies': df[start:end].copies.sum(),
-            }
-        )
-    portions.append(
-        {
-            'pool': pool,
-            'start': end,
-            'end': '+',
-            'copies': df[end:].copies.sum(),
-        }
-    )
-    return portions
-
-
-def _get_d(df, d):
-    return (
-        df.sort_values('copies', ascending=False).head(d).copies.sum()
-    ) / df.copies.sum()
-
-
-def _label(r):
-    if r['end'] != '+':
-        return f'{r["start"] + 1}-{r["end"]}'
-    return f'{r["start"] + 1}+'
+def _label(start, end):
+    if end is not None:
+        return f'{start + 1}-{end}'
+    return f'{start + 1}+'
 
 
 def plot_ranges(df, pool, intervals=(10, 100, 1000), order_func=None, **kwargs):
     intervals = [0, *intervals]
-    portions = []
-    total_clones = Counter()
+    ranked = RankedSizes(df, pool)
 
-    df.groupby(pool).apply(_range_for_pool, portions, total_clones, intervals)
-
-    portions = pd.DataFrame(portions)
-    portions['pool'] = portions['pool'].apply(
-        lambda p: f'{p} ({total_clones[p]})'
-    )
-    portions['range'] = portions.apply(_label, axis=1)
-    pdf = portions.pivot_table(
-        index='pool', columns='range', values='copies', aggfunc=np.sum
-    )
+    labels = [
+        f'{p} ({clones})' for p, clones in zip(ranked.pools, ranked.clones())
+    ]
+    pdf = pd.DataFrame(
+        ranked.range_totals(intervals),
+        index=pd.Index(labels, name='pool'),
+        columns=pd.Index(
+            [
+                _label(start, end)
+                for start, end in zip(intervals, [*intervals[1:], None])
+            ],
+            name='range',
+        ),
+    ).sort_index()
     pdf = pdf.div(-pdf.sum(axis=1), axis=0)
 
-    order = pd.Series(
-        int(re.search(r'\d+', c).group(0)) for c in pdf.columns
-    ).argsort()
-
-    pdf = pdf[pdf.columns[order]].reindex(
-        pdf[pdf.columns[:-1]].sum(axis=1).sort_values().index
-    )
+    pdf = pdf.reindex(pdf[pdf.columns[:-1]].sum(axis=1).sort_values().index)
 
     if order_func:
         pdf = order_func(pdf)
     else:
         d20s = list(
-            df.groupby(pool)
-            .apply(_get_d, 20)
+            pd.Series(ranked.top(20) / ranked.totals(), index=ranked.pools)
             .sort_values(ascending=False)
             .index
         )
@@ -281,12 +254,9 @@ def plot_d_index(df, pool, cutoff=20, **kwargs):
     underlying DataFrame.
 
     '''
-    df = (
-        df.groupby(pool)
-        .apply(_get_d, cutoff)
-        .to_frame()
-        .reset_index()
-        .rename({0: 'd'}, axis=1)
+    ranked = RankedSizes(df, pool)
+    df = pd.DataFrame(
+        {pool: ranked.pools, 'd': ranked.top(cutoff) / ranked.totals()}
     )
 
     g = sns.catplot(data=df, x=pool, y='d', **kwargs)
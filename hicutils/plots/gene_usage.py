@@ -1,9 +1,19 @@
 import numpy as np
 import seaborn as sns
 
+from ..core.gene_usage import GENES, GeneUsage
 from .heatmap import basic_clustermap
 
 
+def _get_usage(df, pool, gene, size_metric, usage):
+    assert set(np.atleast_1d(gene)) <= set(GENES)
+    assert size_metric in ('clones', 'copies', 'uniques')
+    if usage is None:
+        return GeneUsage(df, pool)
+    assert usage.pool == list(np.atleast_1d(pool))
+    return usage
+
+
 def plot_gene_heatmap(
     df,
     pool,
@@ -12,6 +22,9 @@ def plot_gene_heatmap(
     size_metric='clones',
     normalize_by='rows',
     cluster_by='both',
+    order=None,
+    usage=None,
+    unique_clones=False,
     **kwargs,
 ):
     '''
@@ -24,8 +37,9 @@ def plot_gene_heatmap(
         The DataFrame to use as the source of gene usage information.
     pool : str
         The pooling column to use for each row of the heatmap.
-    gene : str (``v_gene`` or ``j_gene``)
-        The gene to plot. Must be either ``v_gene`` or ``j_gene``.
+    gene : str (``v_gene`` or ``j_gene``) or list(str)
+        The gene to plot. Must be either ``v_gene`` or ``j_gene``, or both to
+        plot the usage of V/J pairs.
     min_frequency : float
         The minimum frequency across all pools allowed to be included in the
         heatmap.
@@ -39,6 +53,18 @@ def plot_gene_heatmap(
     cluster_by : str (``rows``, ``cols``, or ``both``) or None
         Sets which clustering to display.  Valid values are ``rows``, ``cols``,
         ``both``, or clustering can be disabled with ``None``.
+    order : ClusterOrder or None
+        A precomputed clustering of the rows and columns, e.g. from
+        ``ClusterOrder(pdf)`` on a previously returned ``pdf``, to reuse
+        instead of clustering the plotted matrix.
+    usage : GeneUsage or None
+        Precomputed gene usage of ``df`` by ``pool`` to plot from, which
+        avoids recounting when plotting several genes or size metrics.
+    unique_clones : bool
+        If ``False`` (the default) ``clones`` sums the ``clones`` column, so a
+        clone occurring in several rows of a pool (e.g. in several replicates)
+        is counted once per row.  If ``True`` it is counted once per pool, as
+        in ``plot_gene_frequency``.
 
     Returns
     -------
@@ -47,21 +73,16 @@ def plot_gene_heatmap(
 
     '''
 
-    assert gene in ('v_gene', 'j_gene')
-    assert size_metric in ('clones', 'copies', 'uniques')
-
-    pdf = df.pivot_table(
-        index=pool, columns=gene, values=size_metric, aggfunc=np.sum
-    ).fillna(0)
-
-    total_clones = df.groupby(pool).clone_id.nunique()
-    pdf.index = [f'{c} ({int(total_clones.loc[c])})' for c in pdf.index]
+    usage = _get_usage(df, pool, gene, size_metric, usage)
+    pdf = usage.matrix(gene, size_metric, unique_clones)
+    pdf.index = [f'{c} ({int(usage.pool_clones.loc[c])})' for c in pdf.index]
 
     g = basic_clustermap(
         pdf,
         normalize_by,
         cluster_by,
         min_frequency=min_frequency,
+        order=order,
         figsize=kwargs.pop('figsize', (30, 10)),
         **kwargs,
     )
@@ -69,7 +90,7 @@ def plot_gene_heatmap(
 
 
 def plot_gene_frequency(
-    df, pool, gene, size_metric='clones', by=None, **kwargs
+    df, pool, gene, size_metric='clones', by=None, usage=None, **kwargs
 ):
     '''
     Generates a gene-usage dot/bar plot showing the utilization of each V or J
@@ -89,6 +110,8 @@ def plot_gene_frequency(
     by : str
         The feature to use as the ``hue`` variable for the plot.  Must be
         included in the ``pool`` parameter.
+    usage : GeneUsage or None
+        Precomputed gene usage of ``df`` by ``pool`` to plot from.
 
     Returns
     -------
@@ -97,25 +120,11 @@ def plot_gene_frequency(
 
     '''
 
-    assert gene in ('v_gene', 'j_gene')
-    assert size_metric in ('clones', 'copies', 'uniques')
-
-    if type(pool) == str:
-        pool = [pool]
-    pdf = df.groupby([*pool, gene])
-    if size_metric == 'clones':
-        pdf = (
-            pdf.clone_id.nunique()
-            .to_frame()
-            .reset_index()
-            .rename({'clone_id': 'clones'}, axis=1)
-        )
-    else:
-        pdf = pdf[size_metric].sum().to_frame().reset_index()
-
-    pdf['freq'] = pdf.groupby(pool)[size_metric].apply(
-        lambda c: 100 * c / c.sum()
-    )
+    assert gene in GENES
+    usage = _get_usage(df, pool, gene, size_metric, usage)
+    pdf = usage.counts(gene, size_metric).to_frame()
+    pdf['freq'] = usage.frequency(gene, size_metric)
+    pdf = pdf.reset_index()
 
     g = sns.catplot(
         data=pdf,
@@ -3,8 +3,29 @@ import numpy as np
 import seaborn as sns
 import matplotlib.pyplot as plt
 
+from ..core.clustering import ClusterOrder
 
-def basic_clustermap(df, normalize_by, cluster_by, min_frequency=0, **kwargs):
+
+def _cluster_axis(df, order, by):
+    '''
+    Returns ``df`` and the linkage to pass to ``sns.clustermap`` for the
+    ``rows`` or ``cols``.  If the labels differ from those clustered by
+    ``order`` (e.g. some were removed by a cutoff) or the order is
+    approximate, ``df`` is instead reordered by the cached leaf order and no
+    linkage is returned.
+
+    '''
+    labels = df.index if by == 'rows' else df.columns
+    if order.labels(by).equals(labels) and not order.is_approximate(by):
+        return df, order.linkage(by)
+    if by == 'rows':
+        return df.reindex(order.order(by, labels)), None
+    return df[order.order(by, labels)], None
+
+
+def basic_clustermap(
+    df, normalize_by, cluster_by, min_frequency=0, order=None, **kwargs
+):
     assert normalize_by in ('rows', 'cols', None)
     assert cluster_by in ('rows', 'cols', 'both', None)
     if normalize_by == 'rows':
@@ -15,14 +36,27 @@ def basic_clustermap(df, normalize_by, cluster_by, min_frequency=0, **kwargs):
     df[df < min_frequency] = np.nan
     df = df.dropna(axis=1, how='all').fillna(0)
 
+    if order is None:
+        order = ClusterOrder(
+            df,
+            method=kwargs.pop('method', 'average'),
+            metric=kwargs.pop('metric', 'euclidean'),
+        )
+    linkages = {}
+    for by, size in (('rows', len(df)), ('cols', len(df.columns))):
+        if cluster_by in ('both', by) and size > 2:
+            df, linkages[by] = _cluster_axis(df, order, by)
+
     g = sns.clustermap(
         data=df,
         cmap='coolwarm',
-        figsize=kwargs.pop('figsize', (20, len(df) * 2)),
+        figsize=kwargs.pop('figsize', (20, min(len(df) * 2, 40))),
         mask=df == 0,
         linewidths=1,
-        row_cluster=cluster_by in ('both', 'rows') and len(df) > 2,
-        col_cluster=cluster_by in ('both', 'cols') and len(df.columns) > 2,
+        row_cluster=linkages.get('rows') is not None,
+        col_cluster=linkages.get('cols') is not None,
+        row_linkage=linkages.get('rows'),
+        col_linkage=linkages.get('cols'),
         xticklabels=True,
         yticklabels=True,
         **kwargs
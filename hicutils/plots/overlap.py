@@ -1,16 +1,16 @@
-import itertools
-
 import numpy as np
 import pandas as pd
 import seaborn as sns
 import upsetplot as usp
-from scipy.spatial import distance
 
 from matplotlib.colors import ListedColormap, LinearSegmentedColormap
 
-
-def _sort_presence(df):
-    return df.reindex((df / df).sort_values(list(df.columns)).index)
+from ..core.overlap import (
+    Intersections,
+    OverlapMatrix,
+    SIMILARITY_SIZES,
+    stored_similarity,
+)
 
 
 def plot_strings(
@@ -115,43 +115,49 @@ def plot_strings(
         scale and highlight
     ), 'Cannot specify `highlight` when scaling plot.'
 
-    df = df.copy()
-    df['label'] = df[list(overlapping_features)].apply(
-        lambda c: ' '.join([str(s) for s in c]), axis=1
-    )
-
-    pdf = df.pivot_table(
-        index='label', columns=pool, values='copies', aggfunc=np.sum
-    ).fillna(0)
-    if len(pdf.columns) < 2:
+    # Missing feature values are kept, labeled "nan", as clones of their own
+    overlap = OverlapMatrix(df, pool, list(overlapping_features), dropna=False)
+    if len(overlap.pools) < 2:
         raise IndexError('Overlap plots must have at least two columns')
 
-    col_clone_counts = (pdf / pdf).sum()
+    col_clone_counts = overlap.clone_counts()
 
     if only_overlapping:
-        pdf = pdf[(pdf / pdf).sum(axis=1) >= 2]
-        if len(pdf) == 0:
+        overlap = overlap.select(clones=overlap.pool_counts() >= 2)
+        if len(overlap) == 0:
             raise IndexError('No overlapping clones')
 
+    pdf = overlap.to_frame()
+    features = overlap.clones.to_frame(index=False).astype(str)
+    pdf.index = pd.Index(
+        features.iloc[:, 0].str.cat(features.iloc[:, 1:], sep=' ').values,
+        name='label',
+    )
+    pdf = pdf.sort_index()
+
     if pivot_hook:
         pdf = pivot_hook(pdf)
 
+    # Presence is computed once and reordered along with ``pdf``
+    present = (pdf.notna() & pdf.ne(0)).values
     pdf = pdf.div(pdf.sum(axis=0), axis=1) * 100
 
-    pdf['total'] = (pdf / pdf).sum(axis=1)
-    pdf = pdf.sort_values('total', ascending=False).drop('total', axis=1)
-
-    pdf = pdf.head(limit or len(pdf))
-    pdf = pdf.fillna(0)
+    # Ranks are sorted as pandas series so ties keep their previous order
+    pools_per_row = pd.Series(present.sum(axis=1), dtype=np.float64)
+    rows = pools_per_row.sort_values(ascending=False).index[: limit or None]
+    pdf, present = pdf.iloc[rows].fillna(0), present[rows]
     if col_order:
-        pdf = pdf[col_order(pdf)]
+        cols = pdf.columns.get_indexer(col_order(pdf))
     else:
-        pdf = pdf[(pdf / pdf).sum().sort_values().index]
+        rows_per_col = pd.Series(present.sum(axis=0), dtype=np.float64)
+        cols = rows_per_col.sort_values().index
+    pdf, present = pdf.iloc[:, cols], present[:, cols]
 
     if row_order:
         pdf = pdf.reindex(row_order(pdf))
     else:
-        pdf = pdf.reindex((pdf / pdf).sort_values(list(pdf.columns)).index)
+        # Sort by presence in the first column, then the second, and so on
+        pdf = pdf.iloc[np.lexsort(~present[:, ::-1].T)]
 
     if highlight:
         if callable(highlight):
@@ -231,6 +237,7 @@ def plot_upset(
     clone_features=['clone_id'],
     subplots=tuple(),
     subplot_kind='violin',
+    top=None,
     **kwargs,
 ):
     '''
@@ -260,6 +267,9 @@ def plot_upset(
     subplot_kind : str
         The kind of plot to use for ``subplots``.  Any valid ``sns.catplot``
         type is allowed (e.g. ``box``, ``violin``)
+    top : int or None
+        If specified, only the ``top`` largest intersections by ``size`` are
+        plotted.
     kwargs : dict
         Other parameters to pass to ``usp.UpSet``
 
@@ -270,27 +280,44 @@ def plot_upset(
 
     '''
     assert size in ('clones', 'copies')
-    if df.groupby(pool).ngroups < 2:
+    if df.groupby(pool, observed=True).ngroups < 2:
         raise IndexError(f'Pool "{pool}" must have 2+ values')
 
-    pdf = df.pivot_table(
-        index=clone_features, columns=pool, values=size, aggfunc=np.sum
+    overlap = OverlapMatrix(df, pool, clone_features, values=size)
+    intersections = Intersections(overlap)
+    counts_df = (
+        df.groupby(clone_features, observed=True)
+        .agg(
+            copies=('copies', 'sum'),
+            shm=('shm', 'mean'),
+            cdr3_num_nts=('cdr3_num_nts', 'mean'),
+        )
+        .reindex(overlap.clones)
+    )
+    counts_df.insert(0, 'clones', 1)
+
+    keep = intersections.top(
+        top, None if size == 'clones' else counts_df[size].values
+    )
+    in_top = np.isin(intersections.codes, keep)
+    cdf = counts_df[in_top].set_axis(
+        intersections.index[intersections.codes[in_top]]
     )
-    index = pdf.apply(lambda r: r > 0, axis=1).fillna(False)
-
-    counts_df = df.groupby(clone_features).agg(
-        {
-            'clones': lambda v: 1,
-            'copies': np.sum,
-            'shm': np.mean,
-            'cdr3_num_nts': np.mean,
-        }
+
+    # Catplots need the value of each clone, otherwise one precomputed row
+    # per intersection is plotted
+    data = (
+        cdf
+        if subplots
+        else intersections.aggregate(
+            counts_df[['copies', 'shm', 'cdr3_num_nts']],
+            how={'copies': 'sum', 'shm': 'mean', 'cdr3_num_nts': 'mean'},
+        ).iloc[keep]
     )
-    cdf = index.join(counts_df).set_index(list(index.columns))
 
     with sns.plotting_context('notebook'):
         figure = usp.UpSet(
-            cdf,
+            data,
             sum_over=size,
             element_size=50,
             intersection_plot_elements=8,
@@ -311,29 +338,33 @@ def plot_upset(
         return ax, cdf
 
 
-def _get_similarity(df, pool, dist_func_name, clone_features):
-    assert dist_func_name in ('jaccard', 'cosine')
-    use_size = 'clones' if dist_func_name == 'jaccard' else 'copies'
-
-    pdf = df.pivot_table(
-        index=pool, columns=clone_features, values=use_size, aggfunc=np.sum
-    ).fillna(0)
+def _get_similarity(df, pool, dist_func_name, clone_features, cache_dir=None):
+    assert dist_func_name in SIMILARITY_SIZES
+    use_size = SIMILARITY_SIZES[dist_func_name]
 
-    total_clones = (pdf / pdf).sum(axis=1)
-    pdf.index = [
-        '{} ({})'.format(c, int(total_clones.loc[c])) for c in pdf.index
+    overlap = OverlapMatrix(df, pool, clone_features, values=use_size)
+    total_clones = overlap.clone_counts()
+    labels = [
+        '{} ({})'.format(c, int(total_clones.loc[c])) for c in overlap.pools
     ]
-    sim = {}
-    dist_func = getattr(distance, dist_func_name)
-    for s1, s2 in list(itertools.combinations(pdf.index, 2)):
-        fsim = 1 - dist_func(pdf.loc[s1], pdf.loc[s2])
-        sim.setdefault(s1, {})[s2] = sim.setdefault(s2, {})[s1] = round(fsim, 3)
-
-    sim = pd.DataFrame(sim)
-    sim = sim[sim.index]
-    if len(sim) < 2:
+    if len(labels) < 2:
         raise IndexError('Similarity matrix only has one value.')
-    return sim
+
+    if cache_dir:
+        name = '_'.join(
+            [
+                'similarity',
+                dist_func_name,
+                *np.atleast_1d(pool),
+                *np.atleast_1d(clone_features),
+            ]
+        )
+        sim = stored_similarity(overlap, dist_func_name, cache_dir, name)
+    else:
+        sim = overlap.similarity(dist_func_name)
+    sim = sim.values.round(3)
+    np.fill_diagonal(sim, np.nan)
+    return pd.DataFrame(sim, index=labels, columns=labels)
 
 
 def plot_similarity_heatmap(
@@ -342,14 +373,13 @@ def plot_similarity_heatmap(
     dist_func_name,
     clone_features='clone_id',
     cutoff_func=None,
+    cache_dir=None,
     **kwargs,
 ):
     '''
-    Generates an UpSet plot of clonal data.  The UpSet plot may be scaled by
-    clones or copies with ``size`` and the definition of a clone can be varied
-    with the ``clone_features`` parameter.  Further, distributions of other
-    variables such as ``cdr3_num_nts`` and ``shm`` can be placed above each
-    intersection bar with ``subplots``.
+    Generates a heatmap of the pairwise similarity between pools.  All pairs
+    are computed at once from a sparse clone-by-pool matrix so the plot scales
+    to hundreds of pools.
 
     Parameters
     ----------
@@ -357,9 +387,9 @@ def plot_similarity_heatmap(
         The DataFrame to use as the source of clonal overlap information.
     pool : str
         How to pool the clones to calculate similarity
-    dist_func_name : function
-        Function to use for similarity calculation.  Accepts ``jaccard`` or
-        ``cosine``.
+    dist_func_name : str
+        The similarity metric.  Accepts ``jaccard``, ``cosine``, ``overlap``
+        (overlap coefficient), ``morisita_horn``, or ``bray_curtis``.
     clone_features : list(str)
         The feature(s) to use for clone definition.  The default ``clone_id``
         uses the clone definitions in ``df``.  This can be altered to any other
@@ -368,6 +398,10 @@ def plot_similarity_heatmap(
         A function returning a cutoff to designate the maximum value in the
         DataFrame. All values greater than or equal to the returned value are
         remapped to the returned value.
+    cache_dir : str, optional
+        If specified, similarities are kept in a persistent store in this
+        directory so that only pairs involving new or changed pools are
+        computed on subsequent calls.
 
     Returns
     -------
@@ -376,7 +410,9 @@ def plot_similarity_heatmap(
 
     '''
 
-    sim = _get_similarity(df, pool, dist_func_name, clone_features)
+    sim = _get_similarity(
+        df, pool, dist_func_name, clone_features, cache_dir=cache_dir
+    )
     mask = sim.isna()
     sim = sim.fillna(0)
     ret_df = sim = sim[list(sorted(sim.columns))].reindex(sorted(sim.index))
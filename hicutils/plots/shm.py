@@ -1,21 +1,13 @@
-import re
-
-import pandas as pd
+import numpy as np
 import seaborn as sns
 
 
 def _add_counts(df, field):
-    sizes = df.groupby(field).size()
-    df[field] = df[field].apply(lambda f: f'{f} ({sizes[f]})')
+    sizes = df.groupby(field, observed=True).size()
+    df[field] = df[field].map({f: f'{f} ({n})' for f, n in sizes.items()})
     return df
 
 
-def _get_shm(pdf, df, pool, size_metric):
-    total = df[df[pool] == pdf.name[1]][size_metric].sum()
-    ret = pd.Series({'size': 100 * pdf[size_metric].sum() / total})
-    return ret
-
-
 def plot_shm_distribution(
     df, pool, size_metric, palette=None, hue_order=None, **kwargs
 ):
@@ -44,12 +36,16 @@ def plot_shm_distribution(
     df = df.copy()
 
     df = _add_counts(df, pool)
+    totals = df.groupby(pool, observed=True)[size_metric].sum()
     df['shm'] = df['shm'].round()
     df = (
-        df.groupby(['shm', pool])
-        .apply(_get_shm, df, pool, size_metric)
+        df.groupby(['shm', pool], observed=True)[size_metric]
+        .sum()
+        .sort_index()
+        .rename('size')
         .reset_index()
     )
+    df['size'] = 100 * df['size'] / totals.reindex(df[pool]).values
 
     final_colors = None
     if palette:
@@ -111,33 +107,19 @@ def plot_shm_aggregate(df, pool, **kwargs):
     return g, df
 
 
-def _clone_frac_norm(df):
-    df = df.groupby('shm_bucket').clone_id.nunique()
-    df = 100 * df / df.sum()
-    return df.to_frame()
-
-
-def _get_bucket(shm, buckets=(1, 2, 5, 10, 20)):
-    buckets = [0, *buckets]
-    for i, b in enumerate(buckets[:-1]):
-        if b <= shm < buckets[i + 1]:
-            return f'[{b}-{buckets[i + 1]})'
-    return f'{buckets[-1]}+'
-
+def _get_buckets(shm, buckets=(1, 2, 5, 10, 20)):
+    '''
+    Returns the bucket label of each value in ``shm`` and the labels in
+    order.  Values outside every interval, including ``NaN``, fall in the
+    final bucket.
 
-def _sort_buckets(buckets):
-    bucket_info = [
-        (
-            int(re.search(r'\d+', b).group())
-            if '-' in b
-            else int(re.search(r'\d+', b).group()) + 1,
-            b,
-        )
-        for b in buckets
-    ]
-    return [
-        buckets.index(b[1]) for b in sorted(bucket_info, key=lambda b: b[0])
-    ]
+    '''
+    edges = [0, *buckets]
+    labels = [f'[{b}-{e})' for b, e in zip(edges[:-1], edges[1:])]
+    labels.append(f'{edges[-1]}+')
+    bins = np.digitize(shm, edges) - 1
+    bins[(bins < 0) | (bins >= len(labels))] = len(labels) - 1
+    return np.array(labels, dtype=object)[bins], labels
 
 
 def plot_shm_range(df, pool, buckets=(1, 10, 25), order=None, **kwargs):
@@ -166,9 +148,15 @@ def plot_shm_range(df, pool, buckets=(1, 10, 25), order=None, **kwargs):
 
     buckets = [b for b in buckets if b < df.shm.max()]
     df = df.copy()
-    df['shm_bucket'] = df['shm'].apply(_get_bucket, buckets=buckets)
-    df = df.groupby(pool).apply(_clone_frac_norm).unstack()['clone_id']
-    df = df[[df.columns[i] for i in _sort_buckets(list(df.columns))]]
+    df['shm_bucket'], labels = _get_buckets(df['shm'].values, buckets)
+    df = (
+        df.groupby([pool, 'shm_bucket'], observed=True)
+        .clone_id.nunique()
+        .unstack()
+        .sort_index()
+    )
+    df = 100 * df.div(df.sum(axis=1), axis=0)
+    df = df[[label for label in labels if label in df.columns]]
 
     if order:
         df = df.reindex([o for o in order if o in df.index])
@@ -254,7 +242,13 @@ def plot_mutated_fraction(df, pool, threshold=2.0, **kwargs):
     '''
     df = df.copy()
     df['is_mutated'] = df['shm'] >= threshold
-    pdf = df.groupby(pool).is_mutated.mean().to_frame().reset_index()
+    pdf = (
+        df.groupby(pool, observed=True)
+        .is_mutated.mean()
+        .sort_index()
+        .to_frame()
+        .reset_index()
+    )
     g = sns.catplot(data=pdf, x=pool, y='is_mutated', kind='bar', **kwargs)
     g.set(xlabel='', ylabel=f'Fraction of clones >= {threshold}% VH Mutation')
     return g, pdf
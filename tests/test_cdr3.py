@@ -0,0 +1,55 @@
+import pytest
+
+import logomaker
+import pandas as pd
+
+from hicutils.core import io
+from hicutils.core.cdr3 import PositionMatrices, Spectratypes
+
+
+DF = io.read_directory('tests/input')
+
+
+@pytest.mark.parametrize(
+    'by,size_metric', [('cdr3_aa', 'copies'), ('cdr3_nt', 'uniques')]
+)
+def test_position_matrices(by, size_metric):
+    matrices = PositionMatrices(DF, by, 'subject', size_metric)
+    for subject, sdf in DF.groupby('subject'):
+        lengths = sdf[by].str.len()
+        assert list(matrices.lengths(subject)) == sorted(lengths.unique())
+        for length in lengths.unique()[:5]:
+            ldf = sdf[lengths == length]
+            expected = logomaker.alignment_to_matrix(
+                ldf[by], counts=ldf[size_metric].values, pseudocount=0
+            )
+            pd.testing.assert_frame_equal(
+                matrices.count_matrix(length, subject),
+                expected,
+                check_names=False,
+                check_index_type=False,
+            )
+
+
+def test_spectratypes():
+    spectratypes = Spectratypes(DF, 'subject')
+    expected = (
+        DF.groupby(['subject', 'cdr3_num_nts'], observed=True)
+        .copies.sum()
+        .astype(float)
+        .reset_index()
+    )
+    pd.testing.assert_frame_equal(
+        spectratypes.histogram('copies'), expected, check_dtype=False
+    )
+
+    normalized = spectratypes.histogram('copies', normalize=True)
+    assert (
+        normalized.groupby('subject', observed=True).copies.sum().round(6) == 1
+    ).all()
+
+    top = spectratypes.top(3, 'copies')
+    for subject, sdf in DF.groupby('subject'):
+        assert sorted(top[top.subject == subject].copies) == sorted(
+            sdf.copies.nlargest(3)
+        )
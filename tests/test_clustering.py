@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+from scipy.cluster import hierarchy
+
+from hicutils.core import io
+from hicutils.core.clustering import ClusterOrder
+
+
+DF = io.read_directory('tests/input')
+PDF = DF.pivot_table(
+    index='replicate_name', columns='v_gene', values='clones', aggfunc=np.sum
+).fillna(0)
+
+
+def test_cluster_order():
+    order = ClusterOrder(PDF)
+    linkage = hierarchy.linkage(PDF.values, method='average')
+    np.testing.assert_array_equal(order.linkage('rows'), linkage)
+    assert list(order.leaves('rows')) == list(
+        PDF.index[hierarchy.leaves_list(linkage)]
+    )
+    assert order.linkage('rows') is order.linkage('rows')
+
+    subset = PDF.columns[::2]
+    leaves = order.leaves('cols')
+    assert list(order.order('cols', subset)) == [
+        c for c in leaves if c in subset
+    ]
+    assert list(order.order('cols', ['missing', *subset]))[-1] == 'missing'
+
+
+def test_cluster_order_approximate():
+    order = ClusterOrder(PDF.T, sample=5, seed=0)
+    assert order.is_approximate('rows')
+    assert order.linkage('rows') is None
+    leaves = order.leaves('rows')
+    assert sorted(leaves) == sorted(PDF.columns)
+    pd.testing.assert_index_equal(
+        leaves, ClusterOrder(PDF.T, sample=5, seed=0).leaves('rows')
+    )
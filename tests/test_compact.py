@@ -0,0 +1,108 @@
+import pytest
+
+import pandas as pd
+import matplotlib.pyplot as plt
+
+from hicutils.core import filters, io, metadata, pooling
+import hicutils.plots as plots
+
+
+POOL = 'subject'
+DF = io.read_directory('tests/input')
+COMPACT_DF = io.compact(DF)
+# Moves the first subject read last so pools are not observed in sorted
+# order regardless of the order the input files are read
+FIRST = DF.subject == DF.subject.iloc[0]
+REORDERED_DF = pd.concat([DF[~FIRST], DF[FIRST]])
+
+CALLS = {
+    'filter_by_overall_copies': lambda df: filters.filter_by_overall_copies(
+        df, 5
+    ),
+    'filter_functional': lambda df: filters.filter_functional(df),
+    'filter_by_gene_frequency': lambda df: filters.filter_by_gene_frequency(
+        df, 0.01
+    ),
+    'filter_number_of_pools': lambda df: filters.filter_number_of_pools(
+        df, 'METADATA_disease', 2
+    ),
+    'filter_by_presence': lambda df: filters.filter_by_presence(
+        df, POOL, 'HPAP010'
+    ),
+    'remove_potential_contaminates': (
+        lambda df: filters.remove_potential_contaminates(
+            df, POOL, ['HPAP010'], 'cdr3_aa'
+        )
+    ),
+    'pool_by': lambda df: pooling.pool_by(df, ['subject', 'disease']),
+    'make_metadata_table': lambda df: metadata.make_metadata_table(
+        df, 'METADATA_disease'
+    ),
+    'plot_clone_counts': lambda df: plots.plot_clone_counts(df, POOL)[1],
+    'plot_clone_counts_subset': lambda df: plots.plot_clone_counts(
+        df[df.subject != 'HPAP010'], POOL
+    )[1],
+    'plot_clone_sizes': lambda df: plots.plot_clone_sizes(df, cutoff=20)[1],
+    'plot_top_clones': lambda df: plots.plot_top_clones(df, 10)[1],
+    'plot_ranges': lambda df: plots.plot_ranges(df, POOL)[1],
+    'plot_d_index': lambda df: plots.plot_d_index(df, POOL)[1],
+    'plot_gene_heatmap': lambda df: plots.plot_gene_heatmap(
+        df, POOL, 'v_gene', figsize=(12, 6)
+    )[1],
+    'plot_gene_heatmap_subset': lambda df: plots.plot_gene_heatmap(
+        df[df.v_gene != df.v_gene.iloc[0]], POOL, 'v_gene', figsize=(12, 6)
+    )[1],
+    'plot_gene_frequency': lambda df: plots.plot_gene_frequency(
+        df, POOL, 'j_gene'
+    )[1],
+    'plot_cdr3_aa_usage': lambda df: plots.plot_cdr3_aa_usage(df, POOL)[1],
+    'plot_cdr3_logo': lambda df: plots.plot_cdr3_logo(df, 'cdr3_aa', 10)[1],
+    'plot_cdr3_spectratype': lambda df: plots.plot_cdr3_spectratype(df)[1],
+    'plot_cdr3_distribution': lambda df: plots.plot_cdr3_distribution(
+        df, POOL
+    )[1],
+    'plot_strings': lambda df: plots.plot_strings(
+        df, POOL, overlapping_features=('cdr3_aa', 'v_gene'), limit=100
+    )[1],
+    'plot_upset': lambda df: plots.plot_upset(
+        df, 'METADATA_disease', clone_features=['cdr3_aa', 'v_gene']
+    )[1],
+    'plot_similarity_heatmap': lambda df: plots.plot_similarity_heatmap(
+        df, POOL, 'jaccard', clone_features='cdr3_aa'
+    )[1],
+    'plot_shm_distribution': lambda df: plots.plot_shm_distribution(
+        df, POOL, 'copies'
+    )[1],
+    'plot_shm_aggregate': lambda df: plots.plot_shm_aggregate(df, POOL)[1],
+    'plot_shm_range': lambda df: plots.plot_shm_range(df, POOL)[1],
+    'plot_mutated_fraction': lambda df: plots.plot_mutated_fraction(df, POOL)[
+        1
+    ],
+}
+
+
+def test_compact_dtypes():
+    assert COMPACT_DF.cdr3_aa.dtype == 'category'
+    assert COMPACT_DF.METADATA_disease.dtype == 'category'
+    assert (
+        COMPACT_DF.memory_usage(deep=True).sum()
+        < DF.memory_usage(deep=True).sum()
+    )
+
+
+@pytest.mark.parametrize('reorder', [False, True])
+@pytest.mark.parametrize('name', CALLS.keys())
+def test_compact_matches(name, reorder):
+    df = REORDERED_DF if reorder else DF
+    expected = CALLS[name](df)
+    plt.close('all')
+    result = CALLS[name](io.compact(df))
+    plt.close('all')
+    pd.testing.assert_frame_equal(
+        expected,
+        result,
+        check_dtype=False,
+        check_categorical=False,
+        check_index_type=False,
+        check_column_type=False,
+    )
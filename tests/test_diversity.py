@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from hicutils.core import io
+from hicutils.core.diversity import RankedSizes, diversity, size_histogram
+
+
+DF = io.read_directory('tests/input')
+
+
+def _expected(copies):
+    copies = np.sort(copies)[::-1]
+    p = copies / copies.sum()
+    n = len(copies)
+    ascending = copies[::-1]
+    singletons, doubletons = (copies == 1).sum(), (copies == 2).sum()
+    return {
+        'clones': n,
+        'd20': copies[:20].sum() / copies.sum(),
+        'shannon': stats.entropy(p),
+        'simpson': (p**2).sum(),
+        'gini': (
+            2 * (np.arange(1, n + 1) * ascending).sum() / (n * copies.sum())
+            - (n + 1) / n
+        ),
+        'chao1': n + singletons * (singletons - 1) / (2 * (doubletons + 1)),
+        'clonality': 1 - stats.entropy(p) / np.log(n),
+        'hill_0': n,
+        'hill_1': np.exp(stats.entropy(p)),
+        'hill_2': 1 / (p**2).sum(),
+        'hill_0.5': (p**0.5).sum() ** 2,
+    }
+
+
+def test_diversity():
+    metrics = diversity(DF, 'subject', dn=(20,), hill=(0, 1, 2, 0.5))
+    expected = pd.DataFrame(
+        {
+            subject: _expected(sdf.copies.values)
+            for subject, sdf in DF.groupby('subject')
+        }
+    ).T
+    pd.testing.assert_frame_equal(
+        metrics,
+        expected[metrics.columns],
+        check_dtype=False,
+        check_names=False,
+    )
+
+
+def test_range_totals():
+    ranked = RankedSizes(DF, 'replicate_name')
+    totals = ranked.range_totals([0, 10, 100])
+    for i, (_, rdf) in enumerate(DF.groupby('replicate_name')):
+        copies = np.sort(rdf.copies.values)[::-1]
+        assert list(totals[i]) == [
+            copies[:10].sum(),
+            copies[10:100].sum(),
+            copies[100:].sum(),
+        ]
+
+
+def test_size_histogram():
+    hist = size_histogram(DF, 'subject')
+    expected = (
+        DF.groupby(['subject', 'copies']).clone_id.nunique().rename('clones')
+    )
+    pd.testing.assert_series_equal(
+        hist, expected, check_dtype=False, check_names=False
+    )
+
+    binned = size_histogram(DF, 'subject', bins=[1, 10, 100])
+    for (subject, interval), clones in binned.items():
+        sdf = DF[DF.subject == subject].drop_duplicates(['clone_id', 'copies'])
+        assert (
+            clones
+            == sdf.copies.between(
+                interval.left, interval.right, inclusive='left'
+            ).sum()
+        )
+
+    logged = size_histogram(DF, bins=5)
+    assert logged.sum() == len(DF.drop_duplicates(['clone_id', 'copies']))
@@ -0,0 +1,141 @@
+import pytest
+
+import numpy as np
+import pandas as pd
+
+from hicutils.core import filters, io
+
+
+DF = io.read_directory('tests/input')
+STEPS = [
+    ('filter_functional', ()),
+    ('filter_by_overall_copies', (5,)),
+    ('filter_by_gene_frequency', (0.01,)),
+    ('filter_number_of_pools', ('replicate_name', 2, 'less_equal')),
+    ('remove_potential_contaminates', ('subject', ['HPAP010'], 'cdr3_aa')),
+]
+
+
+@pytest.mark.parametrize('df', [DF, io.compact(DF)])
+def test_pipeline_matches_chained(df):
+    expected = df
+    pipeline = filters.FilterPipeline()
+    for name, args in STEPS:
+        expected = getattr(filters, name)(expected, *args)
+        getattr(pipeline, name)(*args)
+    assert 0 < len(expected) < len(df)
+    pd.testing.assert_frame_equal(pipeline.apply(df), expected)
+
+
+def test_filter_by_overall_copies_field():
+    totals = DF.groupby('cdr3_aa').copies.sum()
+    valid = totals[totals >= 10].index
+    pd.testing.assert_frame_equal(
+        filters.filter_by_overall_copies(DF, 10, 'cdr3_aa'),
+        DF[DF.cdr3_aa.isin(valid)],
+    )
+
+
+def test_filter_by_presence_missing():
+    with pytest.raises(KeyError):
+        filters.filter_by_presence(DF, 'subject', 'missing')
+    assert np.all(
+        filters.FilterPipeline()
+        .filter_by_presence('subject', 'HPAP010')
+        .mask(DF)
+        == DF.clone_id.isin(DF[DF.subject == 'HPAP010'].clone_id)
+    )
+
+
+@pytest.mark.parametrize(
+    'by,gene,basis',
+    [
+        ('replicate_name', 'v_gene', 'clones'),
+        ('replicate_name', 'j_gene', 'copies'),
+        ('replicate_name', ['v_gene', 'j_gene'], 'clones'),
+        ('replicate_name', ['v_gene', 'j_gene'], 'copies'),
+        (['subject', 'METADATA_disease'], 'v_gene', 'clones'),
+    ],
+)
+def test_filter_by_gene_frequency(by, gene, basis):
+    pools = [by] if isinstance(by, str) else by
+    genes = [gene] if isinstance(gene, str) else gene
+    sizes = DF.groupby([*pools, *genes]).agg(
+        clones=('clone_id', 'nunique'), copies=('copies', 'sum')
+    )[basis]
+    frequency = sizes / sizes.groupby(pools).transform('sum')
+    min_frequency = frequency.median()
+    valid = frequency[frequency >= min_frequency].reset_index()[
+        [*pools, *genes]
+    ]
+    expected = DF[
+        DF.merge(valid, how='left', indicator=True)._merge.eq('both').values
+    ]
+    result = filters.filter_by_gene_frequency(
+        DF, min_frequency, by, gene, basis
+    )
+    assert 0 < len(result) < len(DF)
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_filter_number_of_pools_list():
+    pd.testing.assert_frame_equal(
+        filters.filter_number_of_pools(DF, ['subject', 'replicate_name'], 2),
+        filters.filter_number_of_pools(DF, 'replicate_name', 2),
+    )
+
+
+def test_clone_index():
+    index = filters.CloneIndex(DF, 'subject', 'cdr3_aa')
+    for subject, sdf in DF.groupby('subject'):
+        assert subject in index
+        assert np.array_equal(
+            index.rows_in([subject]), DF.cdr3_aa.isin(sdf.cdr3_aa)
+        )
+    pd.testing.assert_frame_equal(
+        filters.remove_potential_contaminates(
+            DF, 'subject', ['HPAP010'], 'cdr3_aa', index=index
+        ),
+        filters.remove_potential_contaminates(
+            DF, 'subject', ['HPAP010'], 'cdr3_aa'
+        ),
+    )
+    with pytest.raises(ValueError):
+        filters.filter_by_presence(DF, 'subject', 'HPAP010', index=index)
+    # A DataFrame of the same length with other clones is rejected
+    shuffled = DF.assign(cdr3_aa=DF.cdr3_aa.values[::-1])
+    with pytest.raises(ValueError):
+        filters.remove_potential_contaminates(
+            shuffled, 'subject', ['HPAP010'], 'cdr3_aa', index=index
+        )
+
+
+def test_filter_by_presence_clone_feature():
+    sdf = DF[DF.subject == 'HPAP010']
+    expected = DF[DF.cdr3_aa.isin(sdf.cdr3_aa)]
+    assert len(expected) > len(DF[DF.clone_id.isin(sdf.clone_id)])
+    pd.testing.assert_frame_equal(
+        filters.filter_by_presence(
+            DF, 'subject', 'HPAP010', clone_feature='cdr3_aa'
+        ),
+        expected,
+    )
+    pd.testing.assert_frame_equal(
+        filters.FilterPipeline()
+        .filter_by_presence('subject', 'HPAP010', clone_feature='cdr3_aa')
+        .apply(DF),
+        expected,
+    )
+
+
+def test_filter_by_presence_absent():
+    present = filters.filter_by_presence(DF, 'subject', 'HPAP010')
+    absent = filters.filter_by_presence(
+        DF,
+        'subject',
+        'HPAP010',
+        present=False,
+        index=filters.CloneIndex(DF, 'subject'),
+    )
+    assert len(present) + len(absent) == len(DF)
+    assert not absent.clone_id.isin(present.clone_id).any()
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from hicutils.core import io
+from hicutils.core.gene_usage import GeneUsage
+
+
+DF = io.read_directory('tests/input')
+USAGE = GeneUsage(DF, 'subject')
+
+
+@pytest.mark.parametrize('gene', ['v_gene', 'j_gene', ['v_gene', 'j_gene']])
+@pytest.mark.parametrize('size_metric', ['clones', 'copies', 'uniques'])
+def test_gene_usage(gene, size_metric):
+    groups = DF.groupby(['subject', *np.atleast_1d(gene)])
+    if size_metric == 'clones':
+        expected = groups.clone_id.nunique()
+    else:
+        expected = groups[size_metric].sum()
+    pd.testing.assert_series_equal(
+        USAGE.counts(gene, size_metric),
+        expected,
+        check_dtype=False,
+        check_names=False,
+    )
+
+    frequency = USAGE.frequency(gene, size_metric)
+    np.testing.assert_allclose(frequency.groupby(level='subject').sum(), 100)
+
+
+def test_gene_usage_matrix():
+    pdf = DF.pivot_table(
+        index='subject', columns='v_gene', values='copies', aggfunc=np.sum
+    ).fillna(0)
+    pd.testing.assert_frame_equal(
+        USAGE.matrix('v_gene', 'copies'), pdf, check_dtype=False
+    )
+    pd.testing.assert_series_equal(
+        USAGE.pool_clones,
+        DF.groupby('subject').clone_id.nunique(),
+        check_names=False,
+    )
+
+
+@pytest.mark.parametrize('gene', ['v_gene', ['v_gene', 'j_gene']])
+def test_gene_usage_clone_rows(gene):
+    # A clone in several replicates of a subject is counted once per row
+    # unless unique clones are requested
+    groups = DF.groupby(['subject', *np.atleast_1d(gene)])
+    assert (groups.clones.sum() > groups.clone_id.nunique()).any()
+    pd.testing.assert_series_equal(
+        USAGE.counts(gene, 'clones', unique_clones=False),
+        groups.clones.sum(),
+        check_dtype=False,
+    )
+    pd.testing.assert_frame_equal(
+        USAGE.matrix(gene, 'clones', unique_clones=False),
+        DF.pivot_table(
+            index='subject', columns=gene, values='clones', aggfunc=np.sum
+        ).fillna(0),
+        check_dtype=False,
+    )
@@ -1,5 +1,11 @@
+import json
+import shutil
+
 import pytest
 
+import numpy as np
+import pandas as pd
+
 from hicutils.core import io, metadata
 from .expected import is_expected
 
@@ -17,6 +23,15 @@ def test_read_tsvs(path):
     is_expected(mdf, 'tests/expected/metadata.tsv')
 
 
+def test_metadata_table_multiple_pools():
+    df = io.read_directory('tests/input')
+    mdf = metadata.make_metadata_table(df, ['METADATA_disease', 'subject'])
+    for subject, row in metadata.make_metadata_table(df, 'subject').iterrows():
+        pd.testing.assert_series_equal(
+            mdf.xs(subject, level='subject').iloc[0], row, check_names=False
+        )
+
+
 @pytest.mark.parametrize(
     'path',
     [
@@ -26,3 +41,134 @@ def test_read_tsvs(path):
 def test_convert_igblast(path):
     df = io.convert_igblast(path)
     is_expected(df, 'tests/expected/igblast_test.tsv')
+
+
+@pytest.mark.parametrize('chunksize', [2, 100, 10000])
+def test_convert_igblast_chunked(chunksize, tmp_path):
+    if chunksize > 2:
+        df = io.convert_igblast('tests/input/igblast', chunksize=chunksize)
+        is_expected(df, 'tests/expected/igblast_test.tsv')
+
+    # Missing identities are excluded from the mean and the first read's
+    # junction is kept even when missing, across chunk boundaries
+    reads = pd.DataFrame(
+        {
+            'sequence_id': range(5),
+            'v_call': 'IGHV1-2*01',
+            'j_call': 'IGHJ4*01',
+            'junction_aa': ['CARW'] * 4 + ['CTRW'],
+            'productive': 'T',
+            'v_identity': [90, np.nan, 100, np.nan, np.nan],
+            'junction_length': 12,
+            'junction': [np.nan, *['TGTGCGAGATGG'] * 3, 'TGTACGAGATGG'],
+        }
+    )
+    reads.to_csv(
+        tmp_path / '2022-01-01-human-IGH-S1-rep1.tsv', sep='\t', index=False
+    )
+    expected = io.convert_igblast(str(tmp_path))
+    clones = expected.set_index('cdr3_aa')
+    assert clones.avg_v_identity['CARW'] == 95
+    assert np.isnan(clones.avg_v_identity['CTRW'])
+    assert pd.isna(clones.cdr3_nt['CARW'])
+    pd.testing.assert_frame_equal(
+        io.convert_igblast(str(tmp_path), chunksize=chunksize), expected
+    )
+
+
+def _reads():
+    clone = {
+        'replicate_name': 'r',
+        'v_call': 'IGHV1-2',
+        'j_call': 'IGHJ4',
+        'junction_aa': 'CARW',
+        'productive': 'T',
+        'junction_length': 12,
+        **{k: 'x' for k in io.DEFAULT_METADATA_REGEX.groupindex.keys()},
+    }
+    return pd.DataFrame(
+        [
+            {**clone, 'junction': np.nan, 'v_identity': 90.0},
+            {**clone, 'junction': 'TGTGCGAGATGG', 'v_identity': np.nan},
+            {**clone, 'junction_aa': 'CTRW', 'junction': 'TGTACGAGATGG'},
+        ]
+    )
+
+
+def test_collapse_reads_first_junction():
+    reads = _reads()
+    expected = (
+        reads.assign(copies=1)
+        .groupby(io.IGBLAST_CLONE_COLS)
+        .agg(
+            {
+                'junction': lambda s: s.iloc[0],
+                'v_identity': np.mean,
+                'copies': np.sum,
+            }
+        )
+        .reset_index()
+    )
+    clones = io._collapse_reads(reads)
+    assert clones.junction.isna().sum() == 1
+    pd.testing.assert_frame_equal(clones, expected)
+
+
+def test_read_directory_cache(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    df = io.read_directory('tests/input')
+    for _ in range(2):
+        cached = io.read_directory('tests/input', cache_dir=cache_dir)
+        pd.testing.assert_frame_equal(df, cached)
+
+
+def test_read_directory_cache_entries(tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / 'cache')
+    other = str(tmp_path / 'other')
+    shutil.copytree('tests/input', other)
+    calls = [
+        (path, narrow_dtypes)
+        for path in ('tests/input', other)
+        for narrow_dtypes in (False, True)
+    ]
+
+    dumps = []
+    dump = json.dump
+    monkeypatch.setattr(
+        json, 'dump', lambda *args: dumps.append(1) or dump(*args)
+    )
+    for path, narrow_dtypes in calls:
+        io.read_tsvs(path, cache_dir=cache_dir, narrow_dtypes=narrow_dtypes)
+        io.read_directory(
+            path, cache_dir=cache_dir, narrow_dtypes=narrow_dtypes
+        )
+    # One manifest update per read_tsvs call, including the one made by
+    # read_directory, and per read_directory call
+    assert len(dumps) == 3 * len(calls)
+
+    # Directories, features and dtype modes keep separate entries, so
+    # nothing is read again after alternating between them
+    def _fail(*args, **kwargs):
+        raise AssertionError('Cached file was read again')
+
+    monkeypatch.setattr(io, '_read_tsv', _fail)
+    for path, narrow_dtypes in calls:
+        io.read_tsvs(path, cache_dir=cache_dir, narrow_dtypes=narrow_dtypes)
+        io.read_directory(
+            path, cache_dir=cache_dir, narrow_dtypes=narrow_dtypes
+        )
+
+
+def test_read_directory_narrow_dtypes():
+    df = io.read_directory('tests/input')
+    narrow = io.read_directory('tests/input', processes=2, narrow_dtypes=True)
+    assert narrow.v_gene.dtype == 'category'
+    assert narrow.copies.dtype == 'int32'
+    assert narrow.avg_v_identity.dtype == 'float32'
+    pd.testing.assert_frame_equal(
+        df, narrow, check_dtype=False, check_categorical=False, atol=1e-4
+    )
+    for column in ('shm', 'copies_fraction', 'copies_percent'):
+        pd.testing.assert_series_equal(
+            df[column], narrow[column], check_exact=True
+        )
@@ -0,0 +1,161 @@
+import itertools
+
+import pytest
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import distance
+
+from hicutils.core import io
+from hicutils.core.overlap import (
+    Intersections,
+    OverlapMatrix,
+    SIMILARITY_SIZES,
+    stored_similarity,
+)
+
+
+DF = io.read_directory('tests/input')
+
+
+@pytest.mark.parametrize(
+    'pool,clone_features,values',
+    [
+        ('subject', 'clone_id', 'copies'),
+        ('METADATA_disease', ['cdr3_aa', 'v_gene'], 'clones'),
+    ],
+)
+def test_overlap_matrix(pool, clone_features, values):
+    pdf = DF.pivot_table(
+        index=clone_features, columns=pool, values=values, aggfunc=np.sum
+    )
+    overlap = OverlapMatrix(DF, pool, clone_features, values=values)
+    pd.testing.assert_frame_equal(
+        overlap.to_frame(), pdf.fillna(0), check_dtype=False
+    )
+    pd.testing.assert_series_equal(
+        overlap.pool_counts(),
+        pdf.notna().sum(axis=1),
+        check_names=False,
+        check_dtype=False,
+    )
+    pd.testing.assert_series_equal(
+        overlap.clone_counts(),
+        pdf.notna().sum(),
+        check_names=False,
+        check_dtype=False,
+    )
+    assert np.allclose(overlap.normalize().totals(), 1)
+
+
+def _pairwise(u, v, metric):
+    if metric == 'overlap':
+        return ((u > 0) & (v > 0)).sum() / min((u > 0).sum(), (v > 0).sum())
+    if metric == 'morisita_horn':
+        du, dv = (u**2).sum() / u.sum() ** 2, (v**2).sum() / v.sum() ** 2
+        return 2 * (u * v).sum() / ((du + dv) * u.sum() * v.sum())
+    return 1 - getattr(distance, metric.replace('_', ''))(u, v)
+
+
+@pytest.mark.parametrize('metric', SIMILARITY_SIZES.keys())
+def test_similarity(metric):
+    overlap = OverlapMatrix(
+        DF, 'subject', 'cdr3_aa', values=SIMILARITY_SIZES[metric]
+    )
+    pdf = overlap.to_frame()
+    sim = overlap.similarity(metric)
+    for i, j in itertools.product(pdf.columns, repeat=2):
+        assert np.isclose(
+            sim.loc[i, j], _pairwise(pdf[i].values, pdf[j].values, metric)
+        )
+    pd.testing.assert_frame_equal(
+        overlap.similarity(metric, pools=pdf.columns[:1]), sim.iloc[:1]
+    )
+
+
+def test_stored_similarity(tmp_path, monkeypatch):
+    subjects = sorted(DF.subject.unique())
+    computed = []
+    similarity = OverlapMatrix.similarity
+
+    def _similarity(self, metric, pools=None):
+        computed.append(list(pools))
+        return similarity(self, metric, pools=pools)
+
+    monkeypatch.setattr(OverlapMatrix, 'similarity', _similarity)
+    stored_similarity(
+        OverlapMatrix(DF[DF.subject != subjects[-1]], 'subject'),
+        'cosine',
+        tmp_path,
+        'sim',
+    )
+    overlap = OverlapMatrix(DF, 'subject')
+    sim = stored_similarity(overlap, 'cosine', tmp_path, 'sim')
+    assert computed == [subjects[:-1], subjects[-1:]]
+    pd.testing.assert_frame_equal(sim, similarity(overlap, 'cosine'))
+
+    assert stored_similarity(overlap, 'cosine', tmp_path, 'sim').equals(sim)
+    assert len(computed) == 2
+
+
+def test_intersections():
+    overlap = OverlapMatrix(DF, 'replicate_name')
+    intersections = Intersections(overlap)
+    presence = overlap.to_frame(presence=True)
+    assert (
+        intersections.index[intersections.codes].to_frame().values
+        == presence.values
+    ).all()
+
+    copies = DF.groupby('clone_id').copies.sum().reindex(overlap.clones)
+    table = intersections.aggregate(copies.to_frame())
+    expected = copies.groupby([presence[c] for c in presence.columns]).agg(
+        ['size', 'sum']
+    )
+    assert table.clones.sum() == len(overlap)
+    assert (table.sort_index().values == expected.sort_index().values).all()
+
+    top = intersections.top(2, weights=copies.values)
+    assert list(table.copies.values[top]) == sorted(table.copies)[::-1][:2]
+
+
+def test_memberships_many_pools():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(
+        {
+            'pool': rng.integers(0, 70, 5000),
+            'clone_id': rng.integers(0, 500, 5000),
+            'copies': 1,
+        }
+    )
+    overlap = OverlapMatrix(df, 'pool')
+    words = overlap.memberships()
+    assert words.shape == (len(overlap), 2)
+    presence = overlap.to_frame(presence=True).values
+    for pool in range(len(overlap.pools)):
+        bits = (words[:, pool // 64] >> np.uint64(pool % 64)) & np.uint64(1)
+        assert (bits.astype(bool) == presence[:, pool]).all()
+
+
+def test_stored_similarity_changed_pool(tmp_path):
+    overlap = OverlapMatrix(DF, 'subject', 'cdr3_aa')
+    stored_similarity(overlap, 'cosine', tmp_path, 'sim')
+
+    # Swap the copies of a shared and an unshared clone in the first pool,
+    # keeping its clone count and total unchanged
+    matrix = overlap.matrix.tocsc()
+    shared = np.diff(overlap.matrix.indptr) > 1
+    rows = slice(matrix.indptr[0], matrix.indptr[1])
+    clones, copies = matrix.indices[rows], matrix.data[rows]
+    first = np.flatnonzero(shared[clones])[0]
+    second = np.flatnonzero(~shared[clones] & (copies != copies[first]))[0]
+    copies[[first, second]] = copies[[second, first]]
+    changed = OverlapMatrix._from_parts(
+        matrix.tocsr(), overlap.clones, overlap.pools
+    )
+    assert changed.totals().equals(overlap.totals())
+
+    pd.testing.assert_frame_equal(
+        stored_similarity(changed, 'cosine', tmp_path, 'sim'),
+        changed.similarity('cosine'),
+    )
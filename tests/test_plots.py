@@ -2,6 +2,7 @@ import itertools
 import pytest
 
 import numpy as np
+import pandas as pd
 from hicutils.core import io
 import hicutils.plots as plots
 import matplotlib.pyplot as plt
@@ -68,6 +69,20 @@ def test_gene_heatmap(gene, size_metric):
     plt.savefig(path + '.pdf', bbox_inches='tight')
 
 
+def test_gene_heatmap_unique_clones():
+    # Replicates of a subject share clones, so counting each clone once per
+    # subject gives fewer clones than counting rows
+    _, rows = plots.plot_gene_heatmap(DF, POOL, 'v_gene', cluster_by=None)
+    _, unique = plots.plot_gene_heatmap(
+        DF, POOL, 'v_gene', cluster_by=None, unique_clones=True
+    )
+    expected = DF.groupby([POOL, 'v_gene']).clone_id.nunique().unstack()
+    assert (unique.values <= rows.values).all()
+    assert (unique.values < rows.values).any()
+    np.testing.assert_array_equal(unique.values, expected.fillna(0).values)
+    plt.close('all')
+
+
 @pytest.mark.parametrize(
     'gene,size_metric',
     itertools.product(
@@ -148,6 +163,28 @@ def test_overlap_strings(only_overlapping, overlapping_features, scale, limit):
     plt.savefig(path + '.pdf', bbox_inches='tight')
 
 
+def test_overlap_strings_missing():
+    # Missing feature values are kept as a "nan" clone
+    df = DF.copy()
+    df.loc[df.index[::7], 'cdr3_aa'] = np.nan
+    features = ('cdr3_aa', 'v_gene')
+    labels = df.cdr3_aa.astype(str) + ' ' + df.v_gene.astype(str)
+    expected = df.pivot_table(
+        index=labels, columns=POOL, values='copies', aggfunc=np.sum
+    )
+    expected = expected[expected.notna().sum(axis=1) >= 2]
+    for data in (df, io.compact(df)):
+        _, pdf = plots.plot_strings(data, POOL, overlapping_features=features)
+        assert pdf.index.str.startswith('nan ').any()
+        assert sorted(pdf.index) == sorted(expected.index)
+        pd.testing.assert_series_equal(
+            pdf.sum(axis=1).sort_index(),
+            (expected.div(expected.sum()) * 100).sum(axis=1).sort_index(),
+            check_names=False,
+        )
+    plt.close('all')
+
+
 @pytest.mark.parametrize('dist_func_name', ['cosine', 'jaccard'])
 def test_similarity(dist_func_name):
     path = f'tests/expected/similarity_{dist_func_name}'
@@ -0,0 +1,39 @@
+import pytest
+
+import numpy as np
+import pandas as pd
+
+from hicutils.core import io, pooling
+
+
+DF = io.read_directory('tests/input')
+
+
+@pytest.mark.parametrize('pool', ['subject', 'disease'])
+def test_pool_by(pool):
+    pdf = pooling.pool_by(DF, pool)
+    assert not pdf.duplicated([pool, 'clone_id']).any()
+    assert pdf.copies.sum() == DF.copies.sum()
+    assert np.allclose(pdf.groupby(pool).copies_fraction.sum(), 1)
+
+    clone = DF[DF.clone_id == pdf.clone_id.iloc[0]]
+    pooled = pdf.iloc[0]
+    assert pooled.copies == clone.copies.sum()
+    assert np.isclose(
+        pooled.avg_v_identity,
+        (clone.avg_v_identity * clone.copies).sum() / clone.copies.sum(),
+    )
+    top = clone.sort_values('copies', ascending=False, kind='stable')
+    assert pooled.top_copy_seq == top.top_copy_seq.iloc[0]
+
+
+def test_pool_by_missing_compact():
+    df = DF.copy()
+    df.loc[df.subject == df.subject.iloc[0], 'METADATA_disease'] = np.nan
+    pdf = pooling.pool_by(df, 'disease')
+    compact = pooling.pool_by(io.compact(df), 'disease')
+    assert pdf.disease.isna().any()
+    assert pdf.copies.sum() == DF.copies.sum()
+    pd.testing.assert_frame_equal(
+        pdf, compact, check_dtype=False, check_categorical=False
+    )
@@ -0,0 +1,71 @@
+from math import comb
+
+import numpy as np
+import pandas as pd
+
+from hicutils.core import io
+from hicutils.core.sampling import bootstrap, rarefaction, subsample
+
+
+DF = io.read_directory('tests/input')
+
+
+def _clone_counts(df):
+    return df.groupby('replicate_name').clone_id.nunique()
+
+
+def test_subsample():
+    depth = int(DF.groupby('replicate_name').copies.sum().min())
+    df = DF.assign(original=DF.copies)
+    sdf = subsample(df, 'replicate_name', depth, seed=1)
+    assert (sdf.groupby('replicate_name').copies.sum() == depth).all()
+    assert (sdf.copies <= sdf.original).all()
+    pd.testing.assert_frame_equal(
+        sdf, subsample(df, 'replicate_name', depth, seed=1)
+    )
+    assert np.allclose(sdf.groupby('replicate_name').copies_fraction.sum(), 1)
+
+    shallow = subsample(DF, 'replicate_name', depth + 1, seed=1)
+    assert shallow.replicate_name.nunique() < DF.replicate_name.nunique()
+
+
+def test_bootstrap_reproducible():
+    serial = bootstrap(
+        DF, 'replicate_name', 500, _clone_counts, iterations=4, seed=7
+    )
+    parallel = bootstrap(
+        DF,
+        'replicate_name',
+        500,
+        _clone_counts,
+        iterations=4,
+        seed=7,
+        processes=2,
+    )
+    pd.testing.assert_series_equal(serial, parallel)
+    assert serial.index.get_level_values('iteration').nunique() == 4
+
+
+def test_rarefaction():
+    df = pd.DataFrame(
+        {'pool': ['a', 'a', 'a', 'b', 'b'], 'copies': [5, 2, 1, 3, 3]}
+    )
+    curves = rarefaction(df, 'pool', depths=[1, 3, 6, 8])
+    for pool, pdf in df.groupby('pool'):
+        total = pdf.copies.sum()
+        for depth in curves.index:
+            if depth > total:
+                assert np.isnan(curves.loc[depth, pool])
+                continue
+            expected = sum(
+                1 - comb(total - x, depth) / comb(total, depth)
+                for x in pdf.copies
+            )
+            assert np.isclose(curves.loc[depth, pool], expected)
+
+    totals = DF.groupby('replicate_name').copies.sum()
+    curves = rarefaction(DF, 'replicate_name', depths=sorted(totals))
+    assert np.allclose(
+        [curves.loc[total, name] for name, total in totals.items()],
+        DF.groupby('replicate_name').clone_id.count(),
+    )